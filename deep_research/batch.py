@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+from pathlib import Path
+
+from agents import trace, gen_trace_id
+from dotenv import load_dotenv
+
+from dedup import SearchDeduplicator, SIMILARITY_THRESHOLD
+from outbox import outbox
+from planner_agent import WebSearchItem
+from research_manager import ResearchManager
+from scheduler import BATCH
+from telemetry import telemetry, QueryMetrics
+from writer_agent import render_report
+
+OUTPUT_DIR = Path("reports")
+CHECKPOINT_PATH = Path("batch_checkpoint.jsonl")
+MAX_CONCURRENCY = 8
+
+
+def report_filename(query: str) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", query.lower()).strip("-")[:60]
+    return f"{slug}-{hashlib.sha256(query.encode('utf-8')).hexdigest()[:8]}.md"
+
+
+class Checkpoint:
+    """ Completed plans, searches and reports, so a batch can resume
+
+    Each result is appended to a JSON-lines file as it completes, from a worker thread, so saving stays
+    cheap however large the batch grows. A line cut short by a crash is ignored on load.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.data = {"plans": {}, "searches": {}, "reports": {}}
+        self._lock = asyncio.Lock()
+        if self.path.exists():
+            with self.path.open(encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.data[entry["stage"]][entry["key"]] = entry["value"]
+
+    async def record(self, stage: str, key: str, value) -> None:
+        self.data[stage][key] = value
+        line = json.dumps({"stage": stage, "key": key, "value": value}) + "\n"
+        async with self._lock:
+            await asyncio.to_thread(self._append, line)
+
+    def _append(self, line: str) -> None:
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(line)
+
+
+class BatchResearch:
+    """ Researches many queries at once: plans together, runs each distinct search once, writes every report """
+
+    def __init__(
+        self,
+        queries: list[str],
+        output_dir: Path = OUTPUT_DIR,
+        checkpoint_path: Path = CHECKPOINT_PATH,
+        max_concurrency: int = MAX_CONCURRENCY,
+        dedup_threshold: float | None = SIMILARITY_THRESHOLD,
+        email: str = "none",
+    ):
+        self.queries = list(dict.fromkeys(queries))
+        self.output_dir = Path(output_dir)
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.budget = asyncio.Semaphore(max_concurrency)
+        self.dedup_threshold = dedup_threshold
+        self.email = email
+        self.managers = {query: self._manager(query) for query in self.queries}
+        self.search_manager = self._manager("Batch searches")
+        # The canonical searches each query's report draws on
+        self.search_keys: dict[str, list[str]] = {}
+        # Queries whose plan or report failed, with the error; the rest of the batch carries on
+        self.failed: dict[str, str] = {}
+
+    def _manager(self, label: str) -> ResearchManager:
+        manager = ResearchManager(priority=BATCH, email=self.email, dedup_threshold=self.dedup_threshold)
+        manager.metrics = QueryMetrics(label)
+        return manager
+
+    async def run(self) -> None:
+        trace_id = gen_trace_id()
+        with trace("Batch research trace", trace_id=trace_id):
+            print(f"View trace: https://platform.openai.com/traces/trace?trace_id={trace_id}")
+            try:
+                await self.gather("plan", self.plan, self.queries)
+                searches = self.merge_searches()
+                await self.gather("search", self.search, list(searches.values()))
+                await self.gather("write", self.write, [query for query in self.queries if query in self.search_keys])
+            finally:
+                for manager in [*self.managers.values(), self.search_manager]:
+                    telemetry.finish(manager.metrics)
+        if self.failed:
+            print(f"{len(self.failed)} queries failed and can be retried by running the batch again:")
+            for query, error in self.failed.items():
+                print(f"  {query}: {error}")
+        print(f"Batch complete, reports in {self.output_dir}")
+
+    async def gather(self, stage: str, step, items: list) -> None:
+        """ Run one stage for every item; a failure is recorded against its query instead of ending the batch """
+        results = await asyncio.gather(*(step(item) for item in items), return_exceptions=True)
+        for item, result in zip(items, results):
+            if isinstance(result, Exception):
+                label = getattr(item, "query", item)
+                print(f"Batch {stage} failed for '{label}': {result}")
+                if isinstance(item, str):
+                    self.failed[item] = f"{stage}: {result}"
+
+    async def plan(self, query: str) -> None:
+        if query in self.checkpoint.data["plans"] or query in self.checkpoint.data["reports"]:
+            return
+        async with self.budget:
+            plan = await self.managers[query].plan_searches(query)
+        await self.checkpoint.record("plans", query, [item.model_dump() for item in plan.searches])
+
+    def merge_searches(self) -> dict[str, WebSearchItem]:
+        """ Every distinct search across the pending queries, keyed by its canonical query """
+        deduplicator = SearchDeduplicator(self.dedup_threshold)
+        searches = {}
+        total = 0
+        for query in self.queries:
+            if query in self.checkpoint.data["reports"] or query not in self.checkpoint.data["plans"]:
+                continue
+            keys = []
+            for item in self.checkpoint.data["plans"][query]:
+                canonical = deduplicator.canonical(item["query"])
+                searches.setdefault(canonical, WebSearchItem(**item))
+                keys.append(canonical)
+            self.search_keys[query] = list(dict.fromkeys(keys))
+            total += len(keys)
+        print(f"{len(searches)} distinct searches for {total} planned")
+        return searches
+
+    async def search(self, item: WebSearchItem) -> None:
+        if item.query in self.checkpoint.data["searches"]:
+            return
+        async with self.budget:
+            summary = await self.search_manager.search(item)
+        if summary is None:
+            raise RuntimeError("no result")
+        await self.checkpoint.record("searches", item.query, summary)
+
+    async def write(self, query: str) -> None:
+        if query in self.checkpoint.data["reports"]:
+            return
+        done = self.checkpoint.data["searches"]
+        # A report from some of the searches would be checkpointed as complete and never revisited
+        missing = [key for key in self.search_keys[query] if key not in done]
+        if missing:
+            raise RuntimeError(f"{len(missing)} of {len(self.search_keys[query])} searches failed")
+        results = [done[key] for key in self.search_keys[query]]
+        manager = self.managers[query]
+        async with self.budget:
+            report = await manager.write_report(query, results)
+            await manager.send_email(report)
+        path = self.output_dir / report_filename(query)
+        await asyncio.to_thread(self._save_report, path, render_report(report))
+        await self.checkpoint.record("reports", query, str(path))
+        print(f"Wrote {path}")
+
+    def _save_report(self, path: Path, text: str) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+
+
+if __name__ == "__main__":
+    load_dotenv(override=True)
+    parser = argparse.ArgumentParser(description="Research every query in a file and write the reports to disk")
+    parser.add_argument("queries_file", help="File with one query per line")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="Directory for the reports")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="Checkpoint file used to resume a batch")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY, help="Model calls in flight at once")
+    parser.add_argument("--dedup-threshold", type=float, default=SIMILARITY_THRESHOLD,
+                        help="Similarity above which searches are merged across queries")
+    parser.add_argument("--email", choices=["outbox", "agent", "none"], default="none", help="How each report is emailed")
+    options = parser.parse_args()
+    with open(options.queries_file, encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+
+    async def main():
+        await BatchResearch(
+            queries,
+            options.output,
+            options.checkpoint,
+            options.concurrency,
+            options.dedup_threshold,
+            options.email,
+        ).run()
+        if options.email == "outbox":
+            await outbox.drain()
+
+    asyncio.run(main())
@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import math
+import time
+from collections import defaultdict
+
+from dotenv import load_dotenv
+
+import replay
+from fanout import FanOutLimits
+from research_manager import ResearchManager
+from scheduler import search_scheduler
+from search_cache import search_cache
+
+DEFAULT_QUERIES = [
+    "Latest AI agent frameworks in 2025",
+    "State of small modular nuclear reactors",
+    "How central banks are approaching digital currencies",
+]
+
+
+class TimedResearchManager(ResearchManager):
+    """ ResearchManager that records how long each stage takes """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.timings: dict[str, float] = {}
+
+    async def _timed(self, stage: str, coro):
+        started = time.monotonic()
+        try:
+            return await coro
+        finally:
+            self.timings[stage] = time.monotonic() - started
+
+    async def plan_searches(self, query, ranked=False):
+        return await self._timed("plan", super().plan_searches(query, ranked))
+
+    async def perform_searches(self, search_plan):
+        return await self._timed("search", super().perform_searches(search_plan))
+
+    async def plan_and_search(self, query):
+        return await self._timed("plan+search", super().plan_and_search(query))
+
+    async def write_report(self, query, search_results):
+        return await self._timed("write", super().write_report(query, search_results))
+
+    async def write_report_streamed(self, query, search_results):
+        started = time.monotonic()
+        async for chunk in super().write_report_streamed(query, search_results):
+            self.timings.setdefault("first_token", time.monotonic() - started)
+            yield chunk
+        self.timings["write"] = time.monotonic() - started
+
+    async def send_email(self, report):
+        return await self._timed("email", super().send_email(report))
+
+
+def percentile(values: list[float], p: float) -> float:
+    """ Nearest-rank percentile """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+async def run_query(query: str, options: argparse.Namespace) -> dict[str, float]:
+    manager = TimedResearchManager(
+        stream=options.stream,
+        pipeline=options.pipeline,
+        search_deadline=options.search_deadline,
+        email=options.email,
+        adaptive=FanOutLimits() if options.adaptive else None,
+    )
+    started = time.monotonic()
+    async for _ in manager.run(query):
+        pass
+    return {"end_to_end": time.monotonic() - started, **manager.timings}
+
+
+async def run_level(queries: list[str], concurrency: int, options: argparse.Namespace) -> tuple[list[dict], float]:
+    """ Run `repeat` rounds of `concurrency` simultaneous queries """
+    samples = []
+    started = time.monotonic()
+    for batch_index in range(options.repeat):
+        batch = [queries[(batch_index * concurrency + i) % len(queries)] for i in range(concurrency)]
+        samples += await asyncio.gather(*(run_query(query, options) for query in batch))
+    return samples, time.monotonic() - started
+
+
+def report(concurrency: int, samples: list[dict], elapsed: float) -> None:
+    by_metric = defaultdict(list)
+    for sample in samples:
+        for metric, value in sample.items():
+            by_metric[metric].append(value)
+    print(f"\nConcurrency {concurrency}: {len(samples)} queries, {len(samples) / elapsed:.2f} queries/s")
+    print(f"  {'stage':<12} {'p50':>8} {'p95':>8}")
+    for metric, values in by_metric.items():
+        print(f"  {metric:<12} {percentile(values, 50):>7.2f}s {percentile(values, 95):>7.2f}s")
+
+
+def concurrency_levels(limit: int) -> list[int]:
+    levels = [1]
+    while levels[-1] * 2 < limit:
+        levels.append(levels[-1] * 2)
+    if limit > 1:
+        levels.append(limit)
+    return levels
+
+
+def parse_latency(value: str) -> tuple[str, replay.Latency]:
+    """ Parse "Agent name=median[:spread]" """
+    name, _, spec = value.partition("=")
+    median, _, spread = spec.partition(":")
+    return name, replay.Latency(float(median), float(spread) if spread else 0.3)
+
+
+async def main(options: argparse.Namespace) -> None:
+    queries = options.queries or DEFAULT_QUERIES
+    if options.queries_file:
+        with open(options.queries_file, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    latencies = None if options.recorded_latency else {**replay.DEFAULT_LATENCIES, **dict(options.latency)}
+    replay.install(options.mode, options.fixtures, latencies, options.speed)
+    search_cache.enabled = options.cache
+    search_scheduler.requests_per_second = options.rps
+    search_scheduler.max_concurrency = options.max_concurrency
+
+    levels = concurrency_levels(options.concurrency) if options.mode == "replay" else [1]
+    for concurrency in levels:
+        samples, elapsed = await run_level(queries, concurrency, options)
+        report(concurrency, samples, elapsed)
+
+
+if __name__ == "__main__":
+    load_dotenv(override=True)
+    parser = argparse.ArgumentParser(description="Record fixtures for, or benchmark, the deep research pipeline")
+    parser.add_argument("queries", nargs="*", help="Queries to research (defaults to a built-in set)")
+    parser.add_argument("--queries-file", help="File with one query per line")
+    parser.add_argument("--mode", choices=["replay", "record"], default="replay",
+                        help="record runs against the live API and saves fixtures; replay uses stand-in models")
+    parser.add_argument("--fixtures", default=replay.FIXTURE_DIR, help="Fixture directory")
+    parser.add_argument("--concurrency", type=int, default=8, help="Largest number of simultaneous queries")
+    parser.add_argument("--repeat", type=int, default=3, help="Rounds per concurrency level")
+    parser.add_argument("--latency", type=parse_latency, action="append", default=[],
+                        help='Override an agent\'s latency, e.g. "Search agent=8:0.5" (median seconds:spread)')
+    parser.add_argument("--recorded-latency", action="store_true", help="Replay with the latencies that were recorded")
+    parser.add_argument("--speed", type=float, default=1.0, help="Divide stand-in model latencies by this factor")
+    parser.add_argument("--stream", action="store_true", help="Stream the report")
+    parser.add_argument("--pipeline", action="store_true", help="Pipeline planning and searching")
+    parser.add_argument("--adaptive", action="store_true", help="Grow the number of searches adaptively")
+    parser.add_argument("--search-deadline", type=float, help="Seconds to wait for searches")
+    parser.add_argument("--email", choices=["outbox", "agent", "none"], default="outbox",
+                        help="How the report is emailed")
+    parser.add_argument("--cache", action="store_true", help="Keep the search cache enabled")
+    parser.add_argument("--rps", type=float, default=search_scheduler.requests_per_second,
+                        help="Scheduler requests per second per model")
+    parser.add_argument("--max-concurrency", type=int, default=search_scheduler.max_concurrency,
+                        help="Scheduler concurrent searches per model")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,67 @@
+import math
+import re
+import zlib
+
+# Cosine similarity above which two search queries count as the same search
+SIMILARITY_THRESHOLD = 0.85
+DIMENSIONS = 4096
+NGRAM = 3
+# Years, versions, quarters and other tokens with digits, e.g. "2024", "3.12", "q3"
+_NUMERIC = re.compile(r"\w*\d(?:[\w.]*\w)?")
+
+
+def embed(text: str) -> dict[int, float]:
+    """ Unit-length sparse vector of hashed character trigrams and words """
+    normalized = " ".join(text.lower().split())
+    features = [normalized[i:i + NGRAM] for i in range(max(1, len(normalized) - NGRAM + 1))]
+    features += normalized.split()
+    vector: dict[int, float] = {}
+    for feature in features:
+        index = zlib.crc32(feature.encode("utf-8")) % DIMENSIONS
+        vector[index] = vector.get(index, 0.0) + 1.0
+    norm = math.sqrt(sum(value * value for value in vector.values())) or 1.0
+    return {index: value / norm for index, value in vector.items()}
+
+
+def similarity(a: dict[int, float], b: dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(index, 0.0) for index, value in a.items())
+
+
+def numeric_tokens(text: str) -> frozenset[str]:
+    return frozenset(_NUMERIC.findall(text.lower()))
+
+
+def near_duplicate(a: str, b: str, vector_a: dict[int, float], vector_b: dict[int, float], threshold: float) -> bool:
+    """ Similar enough and with exactly the same numbers: "Nvidia 2024" and "Nvidia 2025" are different searches """
+    return similarity(vector_a, vector_b) >= threshold and numeric_tokens(a) == numeric_tokens(b)
+
+
+class SearchDeduplicator:
+    """ Remembers the queries already dispatched and rejects near-duplicates of them """
+
+    def __init__(self, threshold: float | None = SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.queries: list[str] = []
+        self.vectors: list[dict[int, float]] = []
+        self.skipped = 0
+
+    def canonical(self, query: str) -> str:
+        """ The earlier query this one duplicates, or the query itself, which is then remembered """
+        if self.threshold is None:
+            return query
+        vector = embed(query)
+        for seen_query, seen in zip(self.queries, self.vectors):
+            if near_duplicate(query, seen_query, vector, seen, self.threshold):
+                self.skipped += 1
+                return seen_query
+        self.queries.append(query)
+        self.vectors.append(vector)
+        return query
+
+    def add(self, query: str) -> bool:
+        """ True if the query is new and was added, False if it duplicates an earlier one """
+        skipped = self.skipped
+        self.canonical(query)
+        return self.skipped == skipped
@@ -1,15 +1,26 @@
+import os
+
 import gradio as gr
 from dotenv import load_dotenv
 from research_manager import ResearchManager
+from outbox import outbox
+from telemetry import telemetry
 
 load_dotenv(override=True)
 
+# Seconds to wait for searches before writing the report with what has arrived
+SEARCH_DEADLINE = 90
+
 
 async def run(query: str):
-    async for chunk in ResearchManager().run(query):
+    async for chunk in ResearchManager(stream=True, pipeline=True, search_deadline=SEARCH_DEADLINE).run(query):
         yield chunk
 
 
+async def resume_outbox():
+    await outbox.resume()
+
+
 with gr.Blocks(theme=gr.themes.Default(primary_hue="sky")) as ui:
     gr.Markdown("# Deep Research")
     query_textbox = gr.Textbox(label="What topic would you like to research?")
@@ -18,6 +29,9 @@ with gr.Blocks(theme=gr.themes.Default(primary_hue="sky")) as ui:
     
     run_button.click(fn=run, inputs=query_textbox, outputs=report)
     query_textbox.submit(fn=run, inputs=query_textbox, outputs=report)
+    # Emails a previous run left in the outbox are delivered as soon as the app is up
+    ui.load(fn=resume_outbox)
 
+telemetry.serve(int(os.environ.get("METRICS_PORT", "9464")))
 ui.launch(inbrowser=True)
 
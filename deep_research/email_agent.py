@@ -6,16 +6,27 @@ from sendgrid.helpers.mail import Email, Mail, Content, To
 from agents import Agent, function_tool
 
 
-@function_tool
-def send_email(subject: str, html_body: str) -> Dict[str, str]:
-    """Send an email with the given subject and HTML body"""
-    sg = sendgrid.SendGridAPIClient(api_key=os.environ.get("SENDGRID_API_KEY"))
+_client: sendgrid.SendGridAPIClient | None = None
+
+
+def deliver(subject: str, html_body: str) -> int:
+    """Send an email through SendGrid, reusing one client, and return the HTTP status"""
+    global _client
+    if _client is None:
+        _client = sendgrid.SendGridAPIClient(api_key=os.environ.get("SENDGRID_API_KEY"))
     from_email = Email("ed@edwarddonner.com")  # put your verified sender here
     to_email = To("ed.donner@gmail.com")  # put your recipient here
     content = Content("text/html", html_body)
     mail = Mail(from_email, to_email, subject, content).get()
-    response = sg.client.mail.send.post(request_body=mail)
+    response = _client.client.mail.send.post(request_body=mail)
     print("Email response", response.status_code)
+    return response.status_code
+
+
+@function_tool
+def send_email(subject: str, html_body: str) -> Dict[str, str]:
+    """Send an email with the given subject and HTML body"""
+    deliver(subject, html_body)
     return "success"
 
 
@@ -0,0 +1,78 @@
+import re
+from dataclasses import dataclass
+
+from planner_agent import HOW_MANY_SEARCHES
+
+# Words too common to count towards answering a search
+STOPWORDS = {
+    "about", "and", "are", "does", "for", "from", "how", "into", "latest", "the", "their", "this",
+    "what", "when", "where", "which", "who", "why", "with",
+}
+# Share of a planned search's content words a summary must mention to count as answering it
+ANSWER_SHARE = 0.75
+
+
+def content_terms(text: str) -> set[str]:
+    """ The text's content words, lowercased, with a plural "s" dropped so "runtimes" matches "runtime" """
+    terms = set()
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if len(word) <= 2 or word in STOPWORDS:
+            continue
+        terms.add(word[:-1] if word.endswith("s") and len(word) > 3 and not word.isdigit() else word)
+    return terms
+
+
+def answers(search_terms: set[str], summary_terms: set[str]) -> bool:
+    """ True if the summary mentions enough of a planned search's terms, including every number in it """
+    if not search_terms:
+        return True
+    if any(term[0].isdigit() and term not in summary_terms for term in search_terms):
+        return False
+    return len(search_terms & summary_terms) >= ANSWER_SHARE * len(search_terms)
+
+
+@dataclass
+class FanOutLimits:
+    """ How adaptive fan-out grows: waves of searches until the results answer the plan, stop answering
+    anything new, or a budget runs out """
+    # None starts with as many searches as the scheduler runs at once for the search model, so the first wave
+    # takes no longer than a single search
+    initial_searches: int | None = None
+    searches_per_wave: int = 2
+    # Never more searches than the fixed plan runs
+    max_searches: int = HOW_MANY_SEARCHES
+    # Stop once the results answer this share of the planned searches...
+    min_coverage: float = 0.8
+    # ...or once a wave answers fewer new planned searches than this per search it ran
+    min_novelty: float = 0.5
+    latency_budget: float | None = None
+    cost_budget: float | None = None
+
+
+class FanOutTracker:
+    """ Tracks which planned searches the results so far already answer, so those need not be run """
+
+    def __init__(self, searches: list[str]):
+        self.terms = [content_terms(search) for search in searches]
+        self.answered: set[int] = set()
+        self.searched: set[int] = set()
+
+    def pending(self) -> list[int]:
+        """ Indexes of the planned searches neither run nor answered yet, in plan order """
+        return [i for i in range(len(self.terms)) if i not in self.answered and i not in self.searched]
+
+    def coverage(self) -> float:
+        return len(self.answered) / len(self.terms) if self.terms else 1.0
+
+    def add_wave(self, searched: list[int], summaries: list[str]) -> tuple[float, float]:
+        """ Record a wave and return its (novelty, coverage): the planned searches newly answered per search
+        run, and the share of the plan answered so far """
+        self.searched.update(searched)
+        before = len(self.answered)
+        for summary in summaries:
+            summary_terms = content_terms(summary)
+            for i, terms in enumerate(self.terms):
+                if i not in self.answered and answers(terms, summary_terms):
+                    self.answered.add(i)
+        novelty = (len(self.answered) - before) / len(searched) if searched else 0.0
+        return novelty, self.coverage()
@@ -0,0 +1,211 @@
+import asyncio
+import html
+import os
+import re
+import sqlite3
+import time
+from typing import Callable
+from urllib.parse import urlsplit
+
+from email_agent import deliver
+
+OUTBOX_PATH = os.environ.get("OUTBOX_PATH", "outbox.db")
+BATCH_SIZE = 10
+MAX_ATTEMPTS = 5
+BASE_RETRY_DELAY = 5.0
+MAX_RETRY_DELAY = 300.0
+# Seconds between checks for retries that have come due
+POLL_INTERVAL = 5.0
+# Report text comes from web content, so other link schemes (javascript:, data:, ...) are shown as plain text
+LINK_SCHEMES = {"http", "https", "mailto"}
+
+
+def _link(match: re.Match) -> str:
+    label, url = match.group(1), html.unescape(match.group(2))
+    if urlsplit(url).scheme.lower() not in LINK_SCHEMES:
+        return label
+    return f'<a href="{html.escape(url, quote=True)}">{label}</a>'
+
+
+_INLINE = [
+    (re.compile(r"`([^`]+)`"), r"<code>\1</code>"),
+    (re.compile(r"\*\*(.+?)\*\*"), r"<strong>\1</strong>"),
+    (re.compile(r"(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])"), r"<em>\1</em>"),
+    (re.compile(r"\[([^\]]+)\]\(([^)\s]+)\)"), _link),
+]
+_HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+_LIST_ITEM = re.compile(r"^\s*([-*+]|\d+[.)])\s+(.*)$")
+
+
+def _inline(text: str) -> str:
+    text = html.escape(text, quote=False)
+    for pattern, replacement in _INLINE:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def markdown_to_html(markdown: str) -> str:
+    """ Deterministic markdown to HTML for reports: headings, lists, code blocks, emphasis and links """
+    out: list[str] = []
+    paragraph: list[str] = []
+    list_tag: str | None = None
+    code: list[str] | None = None
+
+    def close_blocks():
+        nonlocal list_tag
+        if paragraph:
+            out.append(f"<p>{_inline(' '.join(paragraph))}</p>")
+            paragraph.clear()
+        if list_tag:
+            out.append(f"</{list_tag}>")
+            list_tag = None
+
+    for line in markdown.splitlines():
+        if line.strip().startswith("```"):
+            if code is None:
+                close_blocks()
+                code = []
+            else:
+                out.append(f"<pre><code>{html.escape(chr(10).join(code))}</code></pre>")
+                code = None
+            continue
+        if code is not None:
+            code.append(line)
+            continue
+        heading = _HEADING.match(line)
+        item = _LIST_ITEM.match(line)
+        if not line.strip():
+            close_blocks()
+        elif heading:
+            close_blocks()
+            level = len(heading.group(1))
+            out.append(f"<h{level}>{_inline(heading.group(2))}</h{level}>")
+        elif item:
+            tag = "ol" if item.group(1)[0].isdigit() else "ul"
+            if paragraph or list_tag != tag:
+                close_blocks()
+                out.append(f"<{tag}>")
+                list_tag = tag
+            out.append(f"<li>{_inline(item.group(2))}</li>")
+        else:
+            if list_tag:
+                close_blocks()
+            paragraph.append(line.strip())
+    if code is not None:
+        out.append(f"<pre><code>{html.escape(chr(10).join(code))}</code></pre>")
+    close_blocks()
+    return "\n".join(out)
+
+
+class EmailOutbox:
+    """ Persistent queue of emails, delivered in batches by a background worker with retries """
+
+    def __init__(self, path: str = OUTBOX_PATH, sender: Callable[[str, str], int] = deliver):
+        self.path = path
+        self.sender = sender
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, subject TEXT, html TEXT, status TEXT, "
+            "attempts INTEGER DEFAULT 0, next_attempt REAL, created REAL, error TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt)")
+        self._conn.commit()
+        self._worker: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+
+    def enqueue(self, subject: str, html_body: str) -> int:
+        """ Store the email and make sure the worker is running; returns the outbox id """
+        now = time.time()
+        cursor = self._conn.execute(
+            "INSERT INTO outbox (subject, html, status, next_attempt, created) VALUES (?, ?, 'pending', ?, ?)",
+            (subject, html_body, now, now),
+        )
+        self._conn.commit()
+        self.start()
+        self._wake.set()
+        return cursor.lastrowid
+
+    def start(self) -> None:
+        """ Start the delivery worker on the running event loop, if it is not already running """
+        if self._worker is None or self._worker.done():
+            self._wake = asyncio.Event()
+            self._worker = asyncio.get_running_loop().create_task(self._work())
+
+    async def resume(self) -> int:
+        """ Start delivering emails left pending by an earlier process; returns how many there are """
+        pending = self.pending()
+        if pending:
+            print(f"Outbox: resuming {pending} pending emails")
+            self.start()
+        return pending
+
+    def pending(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+
+    async def drain(self, timeout: float | None = None) -> None:
+        """ Wait until every pending email has been sent or given up on """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending() and (deadline is None or time.monotonic() < deadline):
+            self.start()
+            await asyncio.sleep(0.1)
+
+    def _due(self) -> list[tuple[int, str, str, int]]:
+        return self._conn.execute(
+            "SELECT id, subject, html, attempts FROM outbox WHERE status = 'pending' AND next_attempt <= ? "
+            "ORDER BY next_attempt LIMIT ?",
+            (time.time(), BATCH_SIZE),
+        ).fetchall()
+
+    def _idle_timeout(self) -> float:
+        """ Seconds until the next retry comes due, capped at POLL_INTERVAL """
+        next_attempt = self._conn.execute(
+            "SELECT MIN(next_attempt) FROM outbox WHERE status = 'pending'"
+        ).fetchone()[0]
+        if next_attempt is None:
+            return POLL_INTERVAL
+        return min(POLL_INTERVAL, max(0.0, next_attempt - time.time()))
+
+    def _send_batch(self, batch: list[tuple[int, str, str, int]]) -> list[tuple[int, int, str | None]]:
+        results = []
+        for id, subject, html_body, attempts in batch:
+            try:
+                status = self.sender(subject, html_body)
+                error = None if status < 300 else f"HTTP {status}"
+            except Exception as e:
+                error = str(e)
+            results.append((id, attempts + 1, error))
+        return results
+
+    def _record(self, results: list[tuple[int, int, str | None]]) -> None:
+        now = time.time()
+        for id, attempts, error in results:
+            if error is None:
+                self._conn.execute("UPDATE outbox SET status = 'sent', attempts = ?, error = NULL WHERE id = ?", (attempts, id))
+            elif attempts >= MAX_ATTEMPTS:
+                print(f"Giving up on email {id} after {attempts} attempts: {error}")
+                self._conn.execute("UPDATE outbox SET status = 'failed', attempts = ?, error = ? WHERE id = ?", (attempts, error, id))
+            else:
+                delay = min(MAX_RETRY_DELAY, BASE_RETRY_DELAY * 2 ** (attempts - 1))
+                self._conn.execute(
+                    "UPDATE outbox SET attempts = ?, error = ?, next_attempt = ? WHERE id = ?",
+                    (attempts, error, now + delay, id),
+                )
+        self._conn.commit()
+
+    async def _work(self) -> None:
+        while True:
+            self._wake.clear()
+            batch = self._due()
+            if not batch:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self._idle_timeout())
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            results = await asyncio.to_thread(self._send_batch, batch)
+            self._record(results)
+            print(f"Outbox: sent {sum(1 for _, _, error in results if error is None)}/{len(results)} emails")
+
+
+outbox = EmailOutbox()
@@ -1,11 +1,19 @@
+import re
+
 from pydantic import BaseModel, Field
 from agents import Agent
 
 HOW_MANY_SEARCHES = 5
+# Upper bound on the ranked plan used by adaptive fan-out
+MAX_SEARCHES = 10
 
 INSTRUCTIONS = f"You are a helpful research assistant. Given a query, come up with a set of web searches \
 to perform to best answer the query. Output {HOW_MANY_SEARCHES} terms to query for."
 
+ADAPTIVE_INSTRUCTIONS = f"You are a helpful research assistant. Given a query, come up with a set of web searches \
+to perform to best answer the query. Output up to {MAX_SEARCHES} terms to query for, ordered from most to least \
+important, so that the first few alone give a good answer. Use fewer terms for simple queries."
+
 
 class WebSearchItem(BaseModel):
     reason: str = Field(description="Your reasoning for why this search is important to the query.")
@@ -20,4 +28,52 @@ planner_agent = Agent(
     instructions=INSTRUCTIONS,
     model="gpt-4o-mini",
     output_type=WebSearchPlan,
-)
\ No newline at end of file
+)
+
+
+_SEARCHES_FIELD = re.compile(r'"searches"\s*:\s*\[')
+
+
+class SearchPlanStream:
+    """ Picks complete WebSearchItems out of the planner's JSON output as it streams in """
+
+    def __init__(self):
+        self.items: list[WebSearchItem] = []
+        self._raw = ""
+        self._pos: int | None = None
+        self._depth = 0
+        self._start = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, delta: str) -> list[WebSearchItem]:
+        """ Add the next chunk of raw model output and return any items completed by it """
+        self._raw += delta
+        if self._pos is None:
+            match = _SEARCHES_FIELD.search(self._raw)
+            if not match:
+                return []
+            self._pos = match.end()
+        new_items = []
+        for i in range(self._pos, len(self._raw)):
+            char = self._raw[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    new_items.append(WebSearchItem.model_validate_json(self._raw[self._start:i + 1]))
+        self._pos = len(self._raw)
+        self.items.extend(new_items)
+        return new_items
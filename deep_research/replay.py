@@ -0,0 +1,295 @@
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict
+
+from agents import Model, ModelResponse, OpenAIProvider, Usage, function_tool, set_tracing_disabled
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputItem,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+)
+from openai.types.responses.response_usage import InputTokensDetails, OutputTokensDetails, ResponseUsage
+from pydantic import TypeAdapter
+
+from planner_agent import planner_agent, HOW_MANY_SEARCHES
+from search_agent import search_agent
+from writer_agent import writer_agent
+from email_agent import email_agent
+from outbox import outbox
+
+FIXTURE_DIR = Path("fixtures")
+# Characters per text delta when replaying a response as a stream
+STREAM_CHUNK = 16
+# Share of a streamed response's latency spent before the first delta
+FIRST_TOKEN_SHARE = 0.1
+
+RESEARCH_AGENTS = [planner_agent, search_agent, writer_agent, email_agent]
+
+_output_items = TypeAdapter(list[ResponseOutputItem])
+
+
+@dataclass
+class Latency:
+    """ Log-normal response latency with the given median and spread, in seconds """
+    median: float
+    spread: float = 0.3
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        return random.lognormvariate(math.log(self.median), self.spread)
+
+
+DEFAULT_LATENCIES = {
+    planner_agent.name: Latency(3.0),
+    search_agent.name: Latency(8.0, 0.5),
+    writer_agent.name: Latency(25.0),
+    email_agent.name: Latency(5.0),
+}
+
+
+def _jsonable(value):
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_unset=True)
+    return str(value)
+
+
+def fingerprint(system_instructions: str | None, input) -> str:
+    """ Hash identifying a model call by everything the model was shown """
+    raw = json.dumps({"instructions": system_instructions, "input": input}, sort_keys=True, default=_jsonable)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class FixtureStore:
+    """ Recorded model responses, one JSONL file per agent """
+
+    def __init__(self, directory: Path = FIXTURE_DIR):
+        self.directory = Path(directory)
+        self._records: dict[str, dict[str, dict]] = {}
+
+    def _path(self, agent_name: str) -> Path:
+        return self.directory / f"{re.sub(r'[^a-z0-9]+', '_', agent_name.lower())}.jsonl"
+
+    def load(self, agent_name: str) -> dict[str, dict]:
+        if agent_name not in self._records:
+            records = {}
+            path = self._path(agent_name)
+            if path.exists():
+                for line in path.read_text(encoding="utf-8").splitlines():
+                    if line.strip():
+                        record = json.loads(line)
+                        records[record["key"]] = record
+            self._records[agent_name] = records
+        return self._records[agent_name]
+
+    def find(self, agent_name: str, key: str) -> dict | None:
+        """ The recording for exactly this call, else any recording of the same agent """
+        records = self.load(agent_name)
+        return records.get(key) or next(iter(records.values()), None)
+
+    def save(self, agent_name: str, record: dict) -> None:
+        self.load(agent_name)[record["key"]] = record
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._path(agent_name).open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def _usage_record(usage) -> dict[str, int]:
+    if usage is None:
+        return {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    return {
+        "input_tokens": usage.input_tokens,
+        "output_tokens": usage.output_tokens,
+        "total_tokens": usage.total_tokens,
+    }
+
+
+class RecordingModel(Model):
+    """ Passes calls through to the real model and saves every response as a fixture """
+
+    def __init__(self, agent_name: str, model_name: str, store: FixtureStore):
+        self.agent_name = agent_name
+        self.model_name = model_name
+        self.model = OpenAIProvider().get_model(model_name)
+        self.store = store
+
+    def __str__(self) -> str:
+        return self.model_name
+
+    def _save(self, system_instructions, input, output, usage, latency: float) -> None:
+        self.store.save(self.agent_name, {
+            "key": fingerprint(system_instructions, input),
+            "output": [item.model_dump() for item in output],
+            "usage": _usage_record(usage),
+            "latency": latency,
+        })
+
+    async def get_response(self, system_instructions, input, *args, **kwargs) -> ModelResponse:
+        started = time.monotonic()
+        response = await self.model.get_response(system_instructions, input, *args, **kwargs)
+        self._save(system_instructions, input, response.output, response.usage, time.monotonic() - started)
+        return response
+
+    async def stream_response(self, system_instructions, input, *args, **kwargs):
+        started = time.monotonic()
+        async for event in self.model.stream_response(system_instructions, input, *args, **kwargs):
+            if isinstance(event, ResponseCompletedEvent):
+                latency = time.monotonic() - started
+                self._save(system_instructions, input, event.response.output, event.response.usage, latency)
+            yield event
+
+
+def _message(text: str) -> ResponseOutputMessage:
+    return ResponseOutputMessage.model_construct(
+        id=f"msg_{uuid.uuid4().hex}",
+        type="message",
+        role="assistant",
+        status="completed",
+        content=[ResponseOutputText.model_construct(type="output_text", text=text, annotations=[])],
+    )
+
+
+def _query_from(input) -> str:
+    text = input if isinstance(input, str) else json.dumps(input, default=_jsonable)
+    return text.split("\n")[0].split(":", 1)[-1].strip()[:80]
+
+
+def synthetic_output(agent_name: str, input) -> list:
+    """ A plausible response for one of the research agents, for when nothing was recorded """
+    query = _query_from(input)
+    if agent_name == planner_agent.name:
+        searches = [
+            {"reason": f"Covers aspect {i + 1} of the query", "query": f"{query} aspect {i + 1}"}
+            for i in range(HOW_MANY_SEARCHES)
+        ]
+        return [_message(json.dumps({"searches": searches}))]
+    if agent_name == writer_agent.name:
+        report = {
+            "short_summary": f"Synthetic findings for {query}.",
+            "markdown_report": f"# {query}\n\n" + "Synthetic report paragraph. " * 200,
+            "follow_up_questions": [f"What else about {query}?"],
+        }
+        return [_message(json.dumps(report))]
+    if agent_name == email_agent.name:
+        if isinstance(input, list) and any(
+            isinstance(item, dict) and item.get("type") == "function_call_output" for item in input
+        ):
+            return [_message("Email sent")]
+        arguments = json.dumps({"subject": "Research report", "html_body": "<p>Synthetic report</p>"})
+        return [ResponseFunctionToolCall.model_construct(
+            id=f"fc_{uuid.uuid4().hex}",
+            call_id=f"call_{uuid.uuid4().hex}",
+            type="function_call",
+            name="send_email",
+            arguments=arguments,
+            status="completed",
+        )]
+    return [_message(f"Synthetic summary of search results for {query}. " * 10)]
+
+
+class StandInModel(Model):
+    """ Replays recorded responses, or synthesizes them, after a sampled delay """
+
+    def __init__(self, agent_name: str, model_name: str, store: FixtureStore, latency: Latency | None = None, speed: float = 1.0):
+        self.agent_name = agent_name
+        self.model_name = model_name
+        self.store = store
+        self.latency = latency
+        self.speed = speed
+
+    def __str__(self) -> str:
+        return self.model_name
+
+    def _respond(self, system_instructions, input) -> tuple[list, dict, float]:
+        record = self.store.find(self.agent_name, fingerprint(system_instructions, input))
+        if record is None:
+            output = synthetic_output(self.agent_name, input)
+            usage = {"input_tokens": len(str(input)) // 4, "output_tokens": 0, "total_tokens": 0}
+            latency = 0.0
+        else:
+            output = _output_items.validate_python(record["output"])
+            usage = record["usage"]
+            latency = record["latency"]
+        if self.latency is not None:
+            latency = self.latency.sample()
+        return output, usage, latency / self.speed
+
+    async def get_response(self, system_instructions, input, *args, **kwargs) -> ModelResponse:
+        output, usage, delay = self._respond(system_instructions, input)
+        await asyncio.sleep(delay)
+        return ModelResponse(output=output, usage=Usage(requests=1, **usage), response_id=None)
+
+    async def stream_response(self, system_instructions, input, *args, **kwargs):
+        output, usage, delay = self._respond(system_instructions, input)
+        text = "".join(
+            part.text for item in output if isinstance(item, ResponseOutputMessage)
+            for part in item.content if isinstance(part, ResponseOutputText)
+        )
+        chunks = [text[i:i + STREAM_CHUNK] for i in range(0, len(text), STREAM_CHUNK)]
+        await asyncio.sleep(delay * FIRST_TOKEN_SHARE)
+        for sequence, chunk in enumerate(chunks):
+            yield ResponseTextDeltaEvent.model_construct(
+                type="response.output_text.delta",
+                delta=chunk,
+                item_id="",
+                output_index=0,
+                content_index=0,
+                sequence_number=sequence,
+            )
+            await asyncio.sleep(delay * (1 - FIRST_TOKEN_SHARE) / max(len(chunks), 1))
+        response = Response.model_construct(
+            id=f"resp_{uuid.uuid4().hex}",
+            object="response",
+            model=self.model_name,
+            output=output,
+            usage=ResponseUsage.model_construct(
+                input_tokens_details=InputTokensDetails(cached_tokens=0),
+                output_tokens_details=OutputTokensDetails(reasoning_tokens=0),
+                **usage,
+            ),
+        )
+        yield ResponseCompletedEvent.model_construct(
+            type="response.completed", response=response, sequence_number=len(chunks)
+        )
+
+
+@function_tool(name_override="send_email")
+def replay_send_email(subject: str, html_body: str) -> Dict[str, str]:
+    """Send an email with the given subject and HTML body"""
+    return {"status": "success"}
+
+
+def install(
+    mode: str,
+    fixture_dir: Path = FIXTURE_DIR,
+    latencies: dict[str, Latency] | None = None,
+    speed: float = 1.0,
+) -> FixtureStore:
+    """ Swap the models behind the research agents for recording ("record") or stand-in ("replay") ones """
+    store = FixtureStore(fixture_dir)
+    for agent in RESEARCH_AGENTS:
+        model_name = str(agent.model)
+        if mode == "record":
+            agent.model = RecordingModel(agent.name, model_name, store)
+        elif mode == "replay":
+            latency = (latencies or {}).get(agent.name)
+            agent.model = StandInModel(agent.name, model_name, store, latency, speed)
+        else:
+            raise ValueError(f"Unknown replay mode: {mode}")
+    if mode == "replay":
+        email_agent.tools = [replay_send_email]
+        outbox.sender = lambda subject, html_body: 202
+        set_tracing_disabled(True)
+    return store
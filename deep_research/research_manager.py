@@ -1,84 +1,295 @@
 from agents import Runner, trace, gen_trace_id
 from search_agent import search_agent
-from planner_agent import planner_agent, WebSearchItem, WebSearchPlan
-from writer_agent import writer_agent, ReportData
+from planner_agent import planner_agent, WebSearchItem, WebSearchPlan, SearchPlanStream, ADAPTIVE_INSTRUCTIONS
+from writer_agent import writer_agent, ReportData, MarkdownReportStream, render_report
 from email_agent import email_agent
+from scheduler import search_scheduler, INTERACTIVE
+from search_cache import search_cache
+from telemetry import telemetry, QueryMetrics
+from outbox import outbox, markdown_to_html
+from dedup import SearchDeduplicator, SIMILARITY_THRESHOLD
+from fanout import FanOutLimits, FanOutTracker
+from openai.types.responses import ResponseTextDeltaEvent
 import asyncio
+import time
+
+# Minimum seconds between partial report updates pushed to the UI
+STREAM_INTERVAL = 0.1
+
+
+def report_subject(report: ReportData) -> str:
+    """ The report's first heading, or failing that its summary, as an email subject """
+    for line in report.markdown_report.splitlines():
+        if line.startswith("#"):
+            return line.lstrip("#").strip()
+    return report.short_summary[:80]
+
 
 class ResearchManager:
 
+    def __init__(
+        self,
+        priority: int = INTERACTIVE,
+        stream: bool = False,
+        pipeline: bool = False,
+        search_deadline: float | None = None,
+        email: str = "outbox",
+        dedup_threshold: float | None = SIMILARITY_THRESHOLD,
+        adaptive: FanOutLimits | None = None,
+    ):
+        self.priority = priority
+        self.stream = stream
+        self.pipeline = pipeline
+        self.search_deadline = search_deadline
+        self.email = email
+        self.dedup_threshold = dedup_threshold
+        self.adaptive = adaptive
+        self.metrics = QueryMetrics()
+
     async def run(self, query: str):
         """ Run the deep research process, yielding the status updates and the final report"""
         trace_id = gen_trace_id()
+        self.metrics = QueryMetrics(query)
+        await outbox.resume()
         with trace("Research trace", trace_id=trace_id):
-            print(f"View trace: https://platform.openai.com/traces/trace?trace_id={trace_id}")
-            yield f"View trace: https://platform.openai.com/traces/trace?trace_id={trace_id}"
-            print("Starting research...")
-            search_plan = await self.plan_searches(query)
-            yield "Searches planned, starting to search..."     
-            search_results = await self.perform_searches(search_plan)
-            yield "Searches complete, writing report..."
-            report = await self.write_report(query, search_results)
-            yield "Report written, sending email..."
-            await self.send_email(report)
-            yield "Email sent, research complete"
-            yield report.markdown_report
-        
-
-    async def plan_searches(self, query: str) -> WebSearchPlan:
-        """ Plan the searches to perform for the query """
+            try:
+                print(f"View trace: https://platform.openai.com/traces/trace?trace_id={trace_id}")
+                yield f"View trace: https://platform.openai.com/traces/trace?trace_id={trace_id}"
+                print("Starting research...")
+                if self.adaptive:
+                    yield "Planning and searching..."
+                    search_results = await self.adaptive_search(query)
+                elif self.pipeline:
+                    yield "Planning and searching..."
+                    search_results = await self.plan_and_search(query)
+                else:
+                    search_plan = await self.plan_searches(query)
+                    yield "Searches planned, starting to search..."     
+                    search_results = await self.perform_searches(search_plan)
+                yield "Searches complete, writing report..."
+                if self.stream:
+                    async for chunk in self.write_report_streamed(query, search_results):
+                        if isinstance(chunk, ReportData):
+                            report = chunk
+                        else:
+                            yield chunk
+                    yield render_report(report)
+                    status = await self.send_email(report)
+                    yield f"{render_report(report)}\n\n*{status}, research complete*"
+                    return
+                report = await self.write_report(query, search_results)
+                yield "Report written, sending email..."
+                status = await self.send_email(report)
+                yield f"{status}, research complete"
+                yield report.markdown_report
+            finally:
+                summary = telemetry.finish(self.metrics)
+                print(f"Research took {summary['wall_time']:.1f}s, "
+                      f"{summary['input_tokens'] + summary['output_tokens']} tokens, ${summary['cost']:.4f}")
+
+
+    async def plan_searches(self, query: str, ranked: bool = False) -> WebSearchPlan:
+        """ Plan the searches to perform for the query; a ranked plan lists the most important first """
         print("Planning searches...")
-        result = await Runner.run(
-            planner_agent,
-            f"Query: {query}",
-        )
+        agent = planner_agent.clone(instructions=ADAPTIVE_INSTRUCTIONS) if ranked else planner_agent
+        with self.metrics.span("plan", agent.model) as span:
+            # Through the scheduler, so planning shares the rate limits and rate-limit retries of searching
+            result = await search_scheduler.run(agent, f"Query: {query}", priority=self.priority, span=span)
+            span.record_usage(result)
         print(f"Will perform {len(result.final_output.searches)} searches")
         return result.final_output_as(WebSearchPlan)
 
     async def perform_searches(self, search_plan: WebSearchPlan) -> list[str]:
         """ Perform the searches to perform for the query """
         print("Searching...")
+        started = time.monotonic()
+        deduplicator = self.deduplicator()
+        tasks = [
+            asyncio.create_task(self.search(item)) for item in search_plan.searches if deduplicator.add(item.query)
+        ]
+        if deduplicator.skipped:
+            print(f"Skipping {deduplicator.skipped} near-duplicate searches")
+        return await self.collect_searches(tasks, started)
+
+    async def plan_and_search(self, query: str) -> list[str]:
+        """ Start each search as soon as the planner streams it out, rather than after the whole plan """
+        print("Planning searches...")
+        plan_stream = SearchPlanStream()
+        deduplicator = self.deduplicator()
+        tasks = []
+        started = None
+        try:
+            with self.metrics.span("plan", planner_agent.model) as span:
+                # Through the scheduler, like plan_searches, for its rate limits and priority
+                async with search_scheduler.streamed(
+                    planner_agent, f"Query: {query}", priority=self.priority, span=span
+                ) as result:
+                    async for event in result.stream_events():
+                        if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                            for item in plan_stream.feed(event.data.delta):
+                                if not deduplicator.add(item.query):
+                                    continue
+                                started = started or time.monotonic()
+                                tasks.append(asyncio.create_task(self.search(item)))
+                span.record_usage(result)
+
+            # Anything the incremental parser could not pick out is taken from the final plan
+            search_plan = result.final_output_as(WebSearchPlan)
+            for item in search_plan.searches[len(plan_stream.items):]:
+                if deduplicator.add(item.query):
+                    tasks.append(asyncio.create_task(self.search(item)))
+            if deduplicator.skipped:
+                print(f"Skipping {deduplicator.skipped} near-duplicate searches")
+            print(f"Will perform {len(tasks)} searches")
+            return await self.collect_searches(tasks, started or time.monotonic())
+        finally:
+            # The planner failed or the caller went away: searches already started are not needed
+            for task in tasks:
+                task.cancel()
+
+    async def adaptive_search(self, query: str) -> list[str]:
+        """ Run the top-ranked searches first, and more only while they keep adding information """
+        limits = self.adaptive
+        search_plan = await self.plan_searches(query, ranked=True)
+        deduplicator = self.deduplicator()
+        items = [item for item in search_plan.searches if deduplicator.add(item.query)]
+        tracker = FanOutTracker([item.query for item in items])
+        # One search deadline for the whole run, not one per wave
+        started = time.monotonic()
+        results = []
+        done = 0
+        wave = limits.initial_searches or search_scheduler.concurrency(search_agent)
+        while True:
+            # Planned searches that earlier results already answer are skipped
+            batch = tracker.pending()[:min(wave, limits.max_searches - done)]
+            if not batch:
+                break
+            tasks = [asyncio.create_task(self.search(items[i])) for i in batch]
+            done += len(tasks)
+            summaries = await self.collect_searches(tasks, started)
+            results += summaries
+            novelty, covered = tracker.add_wave(batch, summaries)
+            print(f"Searched {done}: {novelty:.2f} new planned searches answered per search, "
+                  f"{covered:.0%} of {len(items)} answered")
+            if covered >= limits.min_coverage or novelty < limits.min_novelty:
+                break
+            if self.search_deadline is not None and time.monotonic() - started >= self.search_deadline:
+                print("Search deadline reached")
+                break
+            if limits.latency_budget is not None and time.monotonic() - started >= limits.latency_budget:
+                print("Search latency budget spent")
+                break
+            if limits.cost_budget is not None and self.metrics.summary()["cost"] >= limits.cost_budget:
+                print("Search cost budget spent")
+                break
+            wave = limits.searches_per_wave
+        print(f"Used {done} of {len(items)} planned searches")
+        return results
+
+    def deduplicator(self) -> SearchDeduplicator:
+        """ A fresh deduplicator for one plan; dedup_threshold=None lets every search through """
+        return SearchDeduplicator(self.dedup_threshold)
+
+    async def collect_searches(self, tasks: list[asyncio.Task], started: float) -> list[str]:
+        """ Gather search results as they complete, dropping any still running at the deadline """
         num_completed = 0
-        tasks = [asyncio.create_task(self.search(item)) for item in search_plan.searches]
         results = []
-        for task in asyncio.as_completed(tasks):
-            result = await task
-            if result is not None:
-                results.append(result)
-            num_completed += 1
-            print(f"Searching... {num_completed}/{len(tasks)} completed")
+        timeout = None
+        if self.search_deadline is not None:
+            timeout = max(0.0, self.search_deadline - (time.monotonic() - started))
+        try:
+            for task in asyncio.as_completed(tasks, timeout=timeout):
+                result = await task
+                if result is not None:
+                    results.append(result)
+                num_completed += 1
+                print(f"Searching... {num_completed}/{len(tasks)} completed")
+        except asyncio.TimeoutError:
+            stragglers = [task for task in tasks if not task.done()]
+            for task in stragglers:
+                task.cancel()
+            print(f"Search deadline reached, dropping {len(stragglers)} searches")
+        finally:
+            # Cancelled (or a search raised): nothing waits for the rest any more
+            for task in tasks:
+                task.cancel()
         print("Finished searching")
         return results
 
     async def search(self, item: WebSearchItem) -> str | None:
-        """ Perform a search for the query """
-        input = f"Search term: {item.query}\nReason for searching: {item.reason}"
-        try:
+        """ Perform a search for the query, reusing a cached summary when there is one """
+        with self.metrics.span("search", search_agent.model) as span:
+            cached = await search_cache.lookup(search_agent, item.query, self.dedup_threshold)
+            span.cache_hit = cached is not None
+            if cached is not None:
+                return cached
+            input = f"Search term: {item.query}\nReason for searching: {item.reason}"
+            try:
+                result = await search_scheduler.run(search_agent, input, priority=self.priority, span=span)
+                span.record_usage(result)
+                summary = str(result.final_output)
+                await search_cache.put(search_agent, item.query, summary)
+                return summary
+            except Exception as e:
+                print(f"Search failed for '{item.query}': {e}")
+                span.error = type(e).__name__
+                return None
+
+    async def write_report(self, query: str, search_results: list[str]) -> ReportData:
+        """ Write the report for the query """
+        print("Thinking about report...")
+        input = f"Original query: {query}\nSummarized search results: {search_results}"
+        with self.metrics.span("write", writer_agent.model) as span:
             result = await Runner.run(
-                search_agent,
+                writer_agent,
                 input,
             )
-            return str(result.final_output)
-        except Exception:
-            return None
+            span.record_usage(result)
 
-    async def write_report(self, query: str, search_results: list[str]) -> ReportData:
-        """ Write the report for the query """
+        print("Finished writing report")
+        return result.final_output_as(ReportData)
+
+    async def write_report_streamed(self, query: str, search_results: list[str]):
+        """ Write the report, yielding the markdown as it is generated and the ReportData at the end """
         print("Thinking about report...")
         input = f"Original query: {query}\nSummarized search results: {search_results}"
-        result = await Runner.run(
+        result = Runner.run_streamed(
             writer_agent,
             input,
         )
+        stream = MarkdownReportStream()
+        last_update = 0.0
+        with self.metrics.span("write", writer_agent.model) as span:
+            async for event in result.stream_events():
+                if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                    markdown = stream.feed(event.data.delta)
+                    now = time.monotonic()
+                    if markdown and now - last_update >= STREAM_INTERVAL:
+                        last_update = now
+                        yield markdown
+            span.record_usage(result)
 
         print("Finished writing report")
-        return result.final_output_as(ReportData)
+        yield result.final_output_as(ReportData)
     
-    async def send_email(self, report: ReportData) -> None:
+    async def send_email(self, report: ReportData) -> str:
+        """ Hand the report to the outbox (default), to the email agent, or skip it with email="none"
+
+        Returns a status line saying which happened; an outbox email is only queued, not yet sent.
+        """
+        if self.email == "none":
+            return "Email skipped"
+        if self.email == "outbox":
+            with self.metrics.span("email"):
+                outbox.enqueue(report_subject(report), markdown_to_html(report.markdown_report))
+            print("Email queued")
+            return "Email queued"
         print("Writing email...")
-        result = await Runner.run(
-            email_agent,
-            report.markdown_report,
-        )
+        with self.metrics.span("email", email_agent.model) as span:
+            result = await Runner.run(
+                email_agent,
+                report.markdown_report,
+            )
+            span.record_usage(result)
         print("Email sent")
-        return report
\ No newline at end of file
+        return "Email sent"
\ No newline at end of file
@@ -0,0 +1,158 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager
+
+from agents import Runner
+from openai import RateLimitError
+
+# Lower values are served first
+INTERACTIVE = 0
+BATCH = 10
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """ True if the error is the provider telling us to slow down """
+    return isinstance(error, RateLimitError) or getattr(error, "status_code", None) == 429
+
+
+class TokenBucket:
+    """ Hands out at most `rate` tokens per second, allowing bursts of up to `capacity` """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def take(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class PrioritySemaphore:
+    """ A semaphore that wakes the waiter with the lowest priority value first """
+
+    def __init__(self, limit: int):
+        self.available = limit
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    async def acquire(self, priority: int = INTERACTIVE) -> None:
+        if self.available > 0 and not self._waiters:
+            self.available -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been handed to us just before we were cancelled
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.available += 1
+
+
+class SearchScheduler:
+    """ Process-wide gate in front of Runner.run: per-model rate and concurrency limits,
+    priority ordering and jittered retries on rate-limit errors """
+
+    def __init__(
+        self,
+        requests_per_second: float = 2.0,
+        burst: int = 5,
+        max_concurrency: int = 4,
+        model_limits: dict[str, int] | None = None,
+        max_retries: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+    ):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.model_limits = model_limits or {}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._buckets: dict[str, TokenBucket] = {}
+        self._semaphores: dict[str, PrioritySemaphore] = {}
+
+    def _limits_for(self, model: str) -> tuple[TokenBucket, PrioritySemaphore]:
+        if model not in self._semaphores:
+            limit = self.model_limits.get(model, self.max_concurrency)
+            self._semaphores[model] = PrioritySemaphore(limit)
+            self._buckets[model] = TokenBucket(self.requests_per_second, self.burst)
+        return self._buckets[model], self._semaphores[model]
+
+    def concurrency(self, agent) -> int:
+        """ How many runs of the agent's model may be in flight at once """
+        return self.model_limits.get(str(agent.model), self.max_concurrency)
+
+    def backoff(self, attempt: int) -> float:
+        """ Full-jitter exponential backoff for the given retry attempt """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def run(self, agent, input: str, priority: int = INTERACTIVE, span=None):
+        """ Run the agent once a slot and a token are free, retrying when rate limited.
+        Queue wait and retries are recorded on the telemetry span, if one is given """
+        bucket, semaphore = self._limits_for(str(agent.model))
+        queued = time.monotonic()
+        await semaphore.acquire(priority)
+        try:
+            for attempt in range(self.max_retries + 1):
+                await bucket.take()
+                if span is not None:
+                    if attempt == 0:
+                        span.queue_wait = time.monotonic() - queued
+                    span.retries = attempt
+                try:
+                    return await Runner.run(agent, input)
+                except Exception as e:
+                    if attempt == self.max_retries or not is_rate_limit_error(e):
+                        raise
+                    delay = self.backoff(attempt)
+                    print(f"{agent.name} rate limited, retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+                    await asyncio.sleep(delay)
+        finally:
+            semaphore.release()
+
+    @asynccontextmanager
+    async def streamed(self, agent, input: str, priority: int = INTERACTIVE, span=None):
+        """ Runner.run_streamed once a slot and a token are free, holding the slot until the block exits.
+        A streamed run is not retried, since its events may already have been consumed """
+        bucket, semaphore = self._limits_for(str(agent.model))
+        queued = time.monotonic()
+        await semaphore.acquire(priority)
+        try:
+            await bucket.take()
+            if span is not None:
+                span.queue_wait = time.monotonic() - queued
+            result = Runner.run_streamed(agent, input)
+            try:
+                yield result
+            finally:
+                if not result.is_complete:
+                    result.cancel()
+        finally:
+            semaphore.release()
+
+
+search_scheduler = SearchScheduler()
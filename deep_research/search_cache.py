@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from dedup import embed, numeric_tokens, similarity
+
+CACHE_PATH = os.environ.get("SEARCH_CACHE_PATH", "search_cache.db")
+CACHE_TTL = 24 * 60 * 60
+CACHE_MAX_ENTRIES = 5000
+# Most recently used entries compared against a query when looking for a near hit
+SIMILAR_SCAN_LIMIT = 500
+
+
+def normalize_query(query: str) -> str:
+    """ Lowercase and collapse whitespace so trivially different queries share an entry """
+    return " ".join(query.lower().split())
+
+
+def agent_fingerprint(agent) -> str:
+    """ Hash of everything about the agent that changes what a summary looks like """
+    tools = ",".join(sorted(type(tool).__name__ for tool in agent.tools))
+    raw = f"{agent.model}\n{agent.instructions}\n{tools}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class SearchCache:
+    """ On-disk cache of search summaries with a TTL and least-recently-used eviction
+
+    The database is opened on first use. Lookups and writes run in a worker thread, off the event loop. """
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = True
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+        self._vectors: dict[str, dict[int, float]] = {}
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """ The database, opened (and its table created) on first use; callers hold the lock """
+        if self._connection is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                "key TEXT PRIMARY KEY, query TEXT, summary TEXT, created REAL, last_used REAL, agent TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS search_cache_last_used ON search_cache (last_used)")
+            conn.execute("CREATE INDEX IF NOT EXISTS search_cache_agent ON search_cache (agent, last_used)")
+            conn.commit()
+            self._connection = conn
+        return self._connection
+
+    def key(self, agent, query: str) -> str:
+        raw = f"{agent_fingerprint(agent)}\n{normalize_query(query)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, agent, query: str) -> str | None:
+        summary = await asyncio.to_thread(self._exact, agent, query)
+        self._count(summary, "hits")
+        return summary
+
+    async def get_similar(self, agent, query: str, threshold: float) -> str | None:
+        """ The fresh summary whose query is most similar to this one, if any is above the threshold """
+        summary = await asyncio.to_thread(self._similar, agent, query, threshold)
+        self._count(summary, "near_hits")
+        return summary
+
+    async def lookup(self, agent, query: str, threshold: float | None = None) -> str | None:
+        """ An exact hit, else (with a threshold) a near hit; counted once as a hit, near hit or miss """
+        summary = await asyncio.to_thread(self._exact, agent, query)
+        if summary is not None:
+            self._count(summary, "hits")
+            return summary
+        if threshold is not None:
+            summary = await asyncio.to_thread(self._similar, agent, query, threshold)
+        self._count(summary, "near_hits")
+        return summary
+
+    def _count(self, summary: str | None, hit: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if summary is None:
+                self.misses += 1
+            else:
+                setattr(self, hit, getattr(self, hit) + 1)
+
+    def _exact(self, agent, query: str) -> str | None:
+        if not self.enabled:
+            return None
+        key = self.key(agent, query)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, created FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                return None
+            self._conn.execute("UPDATE search_cache SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def _similar(self, agent, query: str, threshold: float) -> str | None:
+        if not self.enabled:
+            return None
+        query = normalize_query(query)
+        vector = embed(query)
+        numbers = numeric_tokens(query)
+        now = time.time()
+        with self._lock:
+            # Only this agent's most recently used entries, so a lookup costs the same however big the cache gets
+            rows = self._conn.execute(
+                "SELECT key, query, summary FROM search_cache WHERE agent = ? AND created >= ? "
+                "ORDER BY last_used DESC LIMIT ?",
+                (agent_fingerprint(agent), now - self.ttl, SIMILAR_SCAN_LIMIT),
+            ).fetchall()
+        best, best_score = None, threshold
+        for key, cached_query, summary in rows:
+            # A different year or version is a different question, however similar the wording
+            if numeric_tokens(cached_query) != numbers:
+                continue
+            if key not in self._vectors:
+                self._vectors[key] = embed(cached_query)
+            score = similarity(vector, self._vectors[key])
+            if score >= best_score:
+                best, best_score = (key, summary), score
+        if best is None:
+            return None
+        with self._lock:
+            self._conn.execute("UPDATE search_cache SET last_used = ? WHERE key = ?", (now, best[0]))
+            self._conn.commit()
+            return best[1]
+
+    async def put(self, agent, query: str, summary: str) -> None:
+        if self.enabled:
+            await asyncio.to_thread(self._put, agent, query, summary)
+
+    def _put(self, agent, query: str, summary: str) -> None:
+        key = self.key(agent, query)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, query, summary, created, last_used, agent) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, normalize_query(query), summary, now, now, agent_fingerprint(agent)),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM search_cache WHERE created < ?", (now - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM search_cache WHERE key IN ("
+            "SELECT key FROM search_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+        if len(self._vectors) > self.max_entries:
+            live = {row[0] for row in self._conn.execute("SELECT key FROM search_cache")}
+            self._vectors = {key: vector for key, vector in self._vectors.items() if key in live}
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "near_hit_rate": self.near_hits / lookups if lookups else 0.0,
+            "entries": size,
+        }
+
+
+search_cache = SearchCache()
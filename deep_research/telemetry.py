@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TELEMETRY_PATH = os.environ.get("TELEMETRY_PATH", "telemetry.jsonl")
+
+# Dollars per million tokens (input, output)
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+# Dollars per hosted web search call at low context size
+WEB_SEARCH_PRICE = 0.025
+
+STAGE_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 40, 60, 120, 300)
+
+
+@dataclass
+class Span:
+    """ One timed stage of a research query """
+    query_id: str
+    stage: str
+    model: str = ""
+    started: float = field(default_factory=time.time)
+    wall_time: float = 0.0
+    queue_wait: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    requests: int = 0
+    retries: int = 0
+    cache_hit: bool | None = None
+    error: str | None = None
+
+    def record_usage(self, result) -> None:
+        """ Copy token counts from a RunResult or finished RunResultStreaming """
+        usage = result.context_wrapper.usage
+        self.input_tokens += usage.input_tokens
+        self.output_tokens += usage.output_tokens
+        self.requests += usage.requests
+
+    @property
+    def cost(self) -> float:
+        input_price, output_price = MODEL_PRICES.get(self.model, (0.0, 0.0))
+        cost = (self.input_tokens * input_price + self.output_tokens * output_price) / 1_000_000
+        if self.stage == "search" and not self.cache_hit and self.requests:
+            cost += WEB_SEARCH_PRICE
+        return cost
+
+
+class QueryMetrics:
+    """ Spans collected while researching one query """
+
+    def __init__(self, query: str = ""):
+        self.query_id = uuid.uuid4().hex
+        self.query = query
+        self.started = time.time()
+        self.spans: list[Span] = []
+
+    @contextmanager
+    def span(self, stage: str, model: str = ""):
+        span = Span(self.query_id, stage, str(model))
+        started = time.monotonic()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.wall_time = time.monotonic() - started
+            self.spans.append(span)
+
+    def summary(self) -> dict:
+        stages = defaultdict(lambda: {"count": 0, "wall_time": 0.0, "max_wall_time": 0.0, "queue_wait": 0.0})
+        for span in self.spans:
+            stage = stages[span.stage]
+            stage["count"] += 1
+            stage["wall_time"] += span.wall_time
+            stage["max_wall_time"] = max(stage["max_wall_time"], span.wall_time)
+            stage["queue_wait"] += span.queue_wait
+        return {
+            "query_id": self.query_id,
+            "query": self.query,
+            "wall_time": time.time() - self.started,
+            "input_tokens": sum(span.input_tokens for span in self.spans),
+            "output_tokens": sum(span.output_tokens for span in self.spans),
+            "cost": sum(span.cost for span in self.spans),
+            "retries": sum(span.retries for span in self.spans),
+            "cache_hits": sum(1 for span in self.spans if span.cache_hit),
+            "errors": sum(1 for span in self.spans if span.error),
+            "stages": dict(stages),
+        }
+
+
+class Telemetry:
+    """ Process-wide sink: appends spans to a JSONL file and keeps Prometheus counters """
+
+    def __init__(self, path: str = TELEMETRY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stage_seconds: dict[str, list[float]] = defaultdict(lambda: [0] * (len(STAGE_BUCKETS) + 2))
+        self._counters: dict[tuple[str, tuple], float] = defaultdict(float)
+        self._server: ThreadingHTTPServer | None = None
+
+    def finish(self, metrics: QueryMetrics) -> dict:
+        """ Export a finished query's spans and return its summary """
+        summary = metrics.summary()
+        with self._lock:
+            for span in metrics.spans:
+                self._observe(span)
+            self._counters[("deep_research_queries_total", ())] += 1
+            self._counters[("deep_research_cost_dollars_total", ())] += summary["cost"]
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    for span in metrics.spans:
+                        f.write(json.dumps({"type": "span", **asdict(span)}) + "\n")
+                    f.write(json.dumps({"type": "query", **summary}) + "\n")
+        return summary
+
+    def _observe(self, span: Span) -> None:
+        # Histogram layout: one slot per bucket, then the +Inf count, then the sum
+        histogram = self._stage_seconds[span.stage]
+        for i, bound in enumerate(STAGE_BUCKETS):
+            if span.wall_time <= bound:
+                histogram[i] += 1
+        histogram[-2] += 1
+        histogram[-1] += span.wall_time
+        stage = (("stage", span.stage),)
+        self._counters[("deep_research_queue_wait_seconds_total", stage)] += span.queue_wait
+        self._counters[("deep_research_retries_total", stage)] += span.retries
+        self._counters[("deep_research_tokens_total", stage + (("direction", "input"),))] += span.input_tokens
+        self._counters[("deep_research_tokens_total", stage + (("direction", "output"),))] += span.output_tokens
+        if span.error:
+            self._counters[("deep_research_errors_total", stage)] += 1
+        if span.cache_hit is not None:
+            result = "hit" if span.cache_hit else "miss"
+            self._counters[("deep_research_cache_lookups_total", (("result", result),))] += 1
+
+    def render(self) -> str:
+        """ All metrics in the Prometheus text exposition format """
+        lines = ["# TYPE deep_research_stage_seconds histogram"]
+        with self._lock:
+            for stage, histogram in sorted(self._stage_seconds.items()):
+                for bound, count in zip(STAGE_BUCKETS, histogram):
+                    lines.append(f'deep_research_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'deep_research_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram[-2]}')
+                lines.append(f'deep_research_stage_seconds_count{{stage="{stage}"}} {histogram[-2]}')
+                lines.append(f'deep_research_stage_seconds_sum{{stage="{stage}"}} {histogram[-1]}')
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> None:
+        """ Expose /metrics on a background thread """
+        if self._server is not None:
+            return
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = telemetry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"Metrics at http://{host}:{port}/metrics")
+
+
+telemetry = Telemetry()
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("agents")
+
+from fanout import FanOutLimits, FanOutTracker
+from planner_agent import WebSearchItem, WebSearchPlan
+from research_manager import ResearchManager
+from scheduler import search_scheduler
+from search_agent import search_agent
+
+PLAN = [
+    "Nvidia data center revenue 2025",
+    "Nvidia gaming GPU sales 2025",
+    "Nvidia stock price forecast analysts",
+    "Nvidia competition AMD Intel AI chips",
+    "Nvidia export restrictions China",
+    "Nvidia Blackwell architecture launch",
+]
+
+# One broad summary that already answers most of the plan, as a search engine tends to return for each query
+REDUNDANT = (
+    "Nvidia reported record data center revenue for fiscal 2025, while gaming GPU sales grew more slowly. "
+    "Analysts raised their stock price forecast as the Blackwell architecture launch ramped up. "
+    "Competition from AMD and Intel in AI chips remains limited, though export restrictions on China weigh on sales."
+)
+
+DISTINCT = {
+    PLAN[0]: "Data center revenue reached $115bn in fiscal 2025, driven by hyperscaler demand.",
+    PLAN[1]: "Gaming GPU sales in 2025 were flat as the RTX 50 series launched late.",
+    PLAN[2]: "Analysts' forecast for the stock price ranges widely; most rate it a buy.",
+    PLAN[3]: "AMD's MI300 and Intel's Gaudi offer competition in AI chips at lower prices.",
+    PLAN[4]: "Export restrictions block sales of the H20 to China.",
+    PLAN[5]: "The Blackwell architecture launch was delayed by a packaging issue.",
+}
+
+
+# The first wave runs as many searches as the scheduler allows at once
+FIRST_WAVE = search_scheduler.concurrency(search_agent)
+
+
+class FakeManager(ResearchManager):
+    def __init__(self, summaries, **kwargs):
+        super().__init__(adaptive=FanOutLimits(), email="none", **kwargs)
+        self.summaries = summaries
+        self.searched = []
+
+    async def plan_searches(self, query, ranked=False):
+        return WebSearchPlan(searches=[WebSearchItem(reason="", query=q) for q in PLAN])
+
+    async def search(self, item):
+        self.searched.append(item.query)
+        return self.summaries(item.query)
+
+
+def test_answered_searches_are_skipped():
+    tracker = FanOutTracker(PLAN)
+    novelty, covered = tracker.add_wave([0], [REDUNDANT])
+    assert covered == 1.0
+    assert tracker.pending() == []
+
+
+def test_adaptive_search_stops_early_on_redundant_results():
+    manager = FakeManager(lambda query: REDUNDANT)
+    results = asyncio.run(manager.adaptive_search("How is Nvidia doing?"))
+    assert len(manager.searched) == FIRST_WAVE
+    assert len(results) == len(manager.searched)
+
+
+def test_adaptive_search_continues_while_results_answer_new_searches():
+    manager = FakeManager(DISTINCT.get)
+    asyncio.run(manager.adaptive_search("How is Nvidia doing?"))
+    assert len(manager.searched) == FanOutLimits().max_searches
+
+
+def test_adaptive_search_stops_when_a_wave_adds_nothing():
+    manager = FakeManager(lambda query: "No relevant results.")
+    asyncio.run(manager.adaptive_search("How is Nvidia doing?"))
+    assert len(manager.searched) == FIRST_WAVE
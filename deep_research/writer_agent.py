@@ -1,3 +1,5 @@
+import re
+
 from pydantic import BaseModel, Field
 from agents import Agent
 
@@ -24,4 +26,66 @@ writer_agent = Agent(
     instructions=INSTRUCTIONS,
     model="gpt-4o-mini",
     output_type=ReportData,
-)
\ No newline at end of file
+)
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_REPORT_FIELD = re.compile(r'"markdown_report"\s*:\s*"')
+
+
+class MarkdownReportStream:
+    """ Pulls the markdown_report value out of the writer's JSON output as it streams in """
+
+    def __init__(self):
+        self.text = ""
+        self.done = False
+        self._raw = ""
+        self._pos: int | None = None
+
+    def feed(self, delta: str) -> str:
+        """ Add the next chunk of raw model output and return the report decoded so far """
+        self._raw += delta
+        if self._pos is None:
+            match = _REPORT_FIELD.search(self._raw)
+            if not match:
+                return self.text
+            self._pos = match.end()
+        raw, i, chunks = self._raw, self._pos, []
+        while i < len(raw) and not self.done:
+            char = raw[i]
+            if char == '"':
+                self.done = True
+            elif char != "\\":
+                chunks.append(char)
+                i += 1
+            elif i + 1 >= len(raw):
+                break
+            elif raw[i + 1] == "u":
+                if i + 6 > len(raw):
+                    break
+                code = int(raw[i + 2:i + 6], 16)
+                if 0xD800 <= code < 0xDC00:
+                    # Characters outside the BMP (emoji) arrive as a high and low surrogate escape pair
+                    low = raw[i + 6:i + 12]
+                    if len(low) < 6 and "\\u".startswith(low[:2]):
+                        break
+                    if low.startswith("\\u") and 0xDC00 <= int(low[2:], 16) < 0xE000:
+                        chunks.append(chr(0x10000 + (code - 0xD800) * 0x400 + int(low[2:], 16) - 0xDC00))
+                        i += 12
+                        continue
+                    code = 0xFFFD
+                elif 0xDC00 <= code < 0xE000:
+                    code = 0xFFFD
+                chunks.append(chr(code))
+                i += 6
+            else:
+                chunks.append(_ESCAPES.get(raw[i + 1], raw[i + 1]))
+                i += 2
+        self._pos = i
+        self.text += "".join(chunks)
+        return self.text
+
+
+def render_report(report: ReportData) -> str:
+    """ The report as shown in the UI, with the summary on top and follow-up questions below """
+    questions = "\n".join(f"- {question}" for question in report.follow_up_questions)
+    return f"> {report.short_summary}\n\n{report.markdown_report}\n\n## Follow-up questions\n\n{questions}"
@@ -1,20 +1,26 @@
 # agent.py
-from typing import Annotated, List, Any, Optional, Dict
+from typing import Annotated, List, Any, Optional, Dict, AsyncIterator, Callable, Tuple
 from typing_extensions import TypedDict
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode
-from langgraph.checkpoint.memory import InMemorySaver
 
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
 
 from pydantic import BaseModel, Field
-from tools import get_browser_tools, get_all_tools
+from tools import SessionTools, get_tool_schemas
+from python_pool import EXEC_TIMEOUT, MAX_WORKERS
+from checkpointer import get_checkpointer
+from context import EvaluatorContext, WorkerWindow, clip, MESSAGE_CHARS
 
 import uuid
+import time
 import asyncio
+import httpx
+from dataclasses import dataclass
 from datetime import datetime
 
 
@@ -24,6 +30,10 @@ class AgentState(TypedDict):
     feedback_on_work: Optional[str]
     success_criteria_met: bool
     user_input_needed: bool
+    iterations: int
+    tokens_used: int
+    started_at: float
+    budget_exhausted: Optional[str]
 
 
 class EvaluatorOutput(BaseModel):
@@ -32,138 +42,423 @@ class EvaluatorOutput(BaseModel):
     user_input_needed: bool = Field(description="True if user clarification or input is required")
 
 
-class SafeToolNode(ToolNode):
-    """ToolNode with graceful error handling."""
-    async def _arun_tools(self, tool_calls: List[Dict]) -> List[ToolMessage]:
-        results = []
-        for tc in tool_calls:
-            try:
-                output = await self._execute_tool_async(tc, self.config)
-                content = str(output.get("content", output))
-            except Exception as e:
-                content = f"Tool error ({tc['name']}): {e}"
-            results.append(ToolMessage(content=content, tool_call_id=tc["id"], name=tc["name"]))
-        return results
+DEFAULT_SUCCESS_CRITERIA = "Provide a clear and accurate answer."
+# Success criteria a user can give to say any answer will do; only these skip the evaluator LLM
+TRIVIAL_SUCCESS_CRITERIA = {"none", "n/a", "na", "any", "anything", "any answer", "no criteria", "whatever"}
+# Evaluator calls per verdict when the reply does not parse
+EVALUATOR_ATTEMPTS = 2
 
 
-class NexusAgent:
-    def __init__(self):
+@dataclass
+class SuperstepBudget:
+    """Limits on one superstep's worker loop; when one is reached the best answer so far is returned."""
+    max_iterations: int = 8
+    max_seconds: float = 300.0
+    max_tokens: int = 150_000
+
+    def exhausted(self, state: AgentState) -> Optional[str]:
+        if state.get("iterations", 0) >= self.max_iterations:
+            return f"reached {self.max_iterations} worker iterations"
+        if time.time() - state.get("started_at", time.time()) >= self.max_seconds:
+            return f"ran for more than {self.max_seconds:.0f}s"
+        if state.get("tokens_used", 0) >= self.max_tokens:
+            return f"used more than {self.max_tokens} tokens"
+        return None
+
+
+def _tokens(message: Any) -> int:
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("total_tokens", 0)
+
+
+# How many calls of one tool may run at once, per process
+TOOL_CONCURRENCY = {"Python_REPL": MAX_WORKERS}
+DEFAULT_TOOL_CONCURRENCY = 4
+# Seconds before a tool call is abandoned and reported as an error
+# (the Python pool enforces its own limit first and restarts the worker)
+TOOL_TIMEOUTS = {"Python_REPL": EXEC_TIMEOUT + 10}
+DEFAULT_TOOL_TIMEOUT = 120
+
+_tool_limits: Dict[str, asyncio.Semaphore] = {}
+
+
+def _tool_limit(name: str) -> asyncio.Semaphore:
+    if name not in _tool_limits:
+        _tool_limits[name] = asyncio.Semaphore(TOOL_CONCURRENCY.get(name, DEFAULT_TOOL_CONCURRENCY))
+    return _tool_limits[name]
+
+
+class SafeToolNode(ToolNode):
+    """ToolNode that runs a turn's tool calls concurrently, with per-tool limits, timeouts and graceful errors.
+
+    The tools it is built with only supply names and schemas; each call runs the calling session's own tool,
+    found with `resolve(thread_id)`.
+    """
+    def __init__(self, tools: List[Any], resolve: Callable[[str], Optional[SessionTools]]):
+        super().__init__(tools)
+        self.resolve = resolve
+
+    # ToolNode's own _afunc runs the tools itself, so the whole turn is handled here
+    async def _afunc(self, input: Any, config: RunnableConfig, runtime: Any = None) -> Dict[str, List[ToolMessage]]:
+        messages = input["messages"] if isinstance(input, dict) else input
+        session = self.resolve(config["configurable"]["thread_id"])
+        return {"messages": await self._arun_tools(messages[-1].tool_calls, session)}
+
+    async def _arun_tools(self, tool_calls: List[Dict], session: Optional[SessionTools]) -> List[ToolMessage]:
+        # gather keeps the results in the same order as the calls
+        return list(await asyncio.gather(*(self._arun_one_safe(tc, session) for tc in tool_calls)))
+
+    async def _arun_one_safe(self, tc: Dict, session: Optional[SessionTools]) -> ToolMessage:
+        name = tc["name"]
+        try:
+            if session is None:
+                raise RuntimeError("this session has been closed")
+            tool = await session.get(name)
+            async with _tool_limit(name):
+                # A tool with only a sync function is run in the executor by ainvoke
+                output = await asyncio.wait_for(tool.ainvoke(tc["args"]), TOOL_TIMEOUTS.get(name, DEFAULT_TOOL_TIMEOUT))
+            content = str(output.get("content", output)) if isinstance(output, dict) else str(output)
+        except asyncio.TimeoutError:
+            content = f"Tool error ({name}): timed out after {TOOL_TIMEOUTS.get(name, DEFAULT_TOOL_TIMEOUT)}s"
+        except Exception as e:
+            content = f"Tool error ({name}): {e}"
+        return ToolMessage(content=content, tool_call_id=tc["id"], name=name)
+
+
+# One keep-alive connection pool for every session's LLM calls
+_http_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=200, max_keepalive_connections=50),
+    timeout=httpx.Timeout(120.0, connect=10.0),
+)
+
+
+class NexusRuntime:
+    """The parts of Nexus every session shares: LLM clients, tool schemas, the compiled graph and checkpointer.
+
+    Sessions differ only in their checkpoint thread (thread_id = agent_id) and their SessionTools.
+    """
+    def __init__(self, budget: Optional[SuperstepBudget] = None):
+        self.budget = budget or SuperstepBudget()
         self.worker_llm = None
         self.evaluator_llm = None
         self.tools: List[Any] = []
         self.graph = None
-        self.agent_id = str(uuid.uuid4())
-        self.memory = InMemorySaver()
-        self.browser = None
-        self.playwright = None
+        self.memory = None
+        self.sessions: Dict[str, SessionTools] = {}
+        self.evaluator_contexts: Dict[str, EvaluatorContext] = {}
+        self.worker_window = WorkerWindow()
 
     async def setup(self):
-        browser_tools, self.browser, self.playwright = await get_browser_tools()
-        self.tools = browser_tools + await get_all_tools()
+        self.memory = await get_checkpointer()
+        # Schemas only: tool backends are imported and started on first use
+        self.tools = get_tool_schemas()
 
-        llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.2)
+        llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.2, http_async_client=_http_client)
         self.worker_llm = llm.bind_tools(self.tools)
-        self.evaluator_llm = llm.with_structured_output(EvaluatorOutput)
+        # include_raw keeps the evaluator's token usage for the budget
+        self.evaluator_llm = llm.with_structured_output(EvaluatorOutput, include_raw=True)
 
         await self._build_graph()
 
     def _build_system_prompt(self, state: AgentState) -> str:
         prompt = f"""You are Nexus, an autonomous AI co-worker with access to many tools including web browsing, code execution, and file management.
 Current time: {datetime.now():%Y-%m-%d %H:%M:%S}
-Success criteria: {state.get('success_criteria', 'Provide a clear and accurate answer.')}
+Success criteria: {state.get('success_criteria', DEFAULT_SUCCESS_CRITERIA)}
 
 Work diligently until the success criteria are met or you need user clarification."""
         if state.get("feedback_on_work"):
             prompt += f"\n\nPrevious attempt was rejected. Feedback: {state['feedback_on_work']}\nCorrect the issues and continue."
         return prompt
 
-    def worker(self, state: AgentState) -> Dict[str, Any]:
-        messages = state["messages"]
+    async def worker(self, state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
         system_prompt = self._build_system_prompt(state)
+        # Fresh system message plus a token-budgeted window over the conversation
+        messages = self.worker_window.build(
+            config["configurable"]["thread_id"], SystemMessage(content=system_prompt), state["messages"]
+        )
 
-        # Inject or update system message
-        if not any(isinstance(m, SystemMessage) for m in messages):
-            messages = [SystemMessage(content=system_prompt)] + messages
-        else:
-            for m in messages:
-                if isinstance(m, SystemMessage):
-                    m.content = system_prompt
-
-        response = self.worker_llm.invoke(messages)
-        return {"messages": [response]}
+        # Passing config on lets graph.astream pick up the streamed tokens
+        response = await self.worker_llm.ainvoke(messages, config)
+        return {
+            "messages": [response],
+            "iterations": state.get("iterations", 0) + 1,
+            "tokens_used": state.get("tokens_used", 0) + _tokens(response),
+        }
 
     def worker_router(self, state: AgentState) -> str:
+        if self.budget.exhausted(state):
+            return "budget"
         last_msg = state["messages"][-1]
         return "tools" if hasattr(last_msg, "tool_calls") and last_msg.tool_calls else "evaluator"
 
-    def evaluator(self, state: AgentState) -> Dict[str, Any]:
-        conversation = "\n".join(
-            f"{type(m).__name__}: {m.content}" for m in state["messages"]
-        )
-        prompt = f"""Success criteria:
+    def _precheck(self, state: AgentState) -> Optional[Dict[str, Any]]:
+        """A verdict without the evaluator LLM, only when the user explicitly set trivial success criteria."""
+        last = state["messages"][-1]
+        text = last.content.strip() if isinstance(last.content, str) else ""
+        criteria = state.get("success_criteria", "").strip().strip(".!").lower()
+        if text and criteria in TRIVIAL_SUCCESS_CRITERIA:
+            return {"feedback": "No success criteria to check against.", "met": True, "input_needed": False}
+        return None
+
+    @staticmethod
+    def _direct_reply(state: AgentState) -> Optional[Tuple[str, str]]:
+        """(request, reply) when the last message answers the latest request directly, with no tool rounds and
+        no earlier rejection – the evaluator then needs nothing else from the conversation."""
+        if state.get("iterations", 0) > 1 or state.get("feedback_on_work"):
+            return None
+        reply = state["messages"][-1]
+        request = state["messages"][-2] if len(state["messages"]) > 1 else None
+        if not isinstance(request, HumanMessage) or not isinstance(reply.content, str):
+            return None
+        return str(request.content), reply.content
+
+    async def evaluator(self, state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
+        verdict = self._precheck(state)
+        if verdict:
+            return {
+                "messages": [AIMessage(content=f"Evaluator: {verdict['feedback']}")],
+                "feedback_on_work": verdict["feedback"],
+                "success_criteria_met": verdict["met"],
+                "user_input_needed": verdict["input_needed"],
+            }
+
+        thread_id = config["configurable"]["thread_id"]
+        context = self.evaluator_contexts.setdefault(thread_id, EvaluatorContext())
+        earlier, new = context.update(state["messages"])
+        direct = self._direct_reply(state)
+        if direct:
+            # A direct reply is judged on the request and the reply alone
+            prompt = f"""User request:
+{clip(direct[0], MESSAGE_CHARS)}
+
+Success criteria:
 {state['success_criteria']}
 
-Full conversation:
-{conversation}
+Assistant response:
+{clip(direct[1], MESSAGE_CHARS)}
+
+Evaluate the assistant response. Be strict but fair. If it only says what it is about to do instead of doing it, the criteria are not met."""
+        else:
+            # The digest of earlier messages comes first so consecutive evaluations share a prompt prefix
+            prompt = f"""Conversation so far (digest):
+{earlier}
+
+Success criteria:
+{state['success_criteria']}
+
+New since your last evaluation:
+{new}
 
 Evaluate ONLY the last assistant response. Be strict but fair. If the assistant claims a file was written or action taken via tool, accept it."""
-        
-        result: EvaluatorOutput = self.evaluator_llm.invoke([
+
+        messages = [
             SystemMessage(content="You are a rigorous evaluator for an autonomous agent."),
             HumanMessage(content=prompt)
-        ])
+        ]
+        tokens = state.get("tokens_used", 0)
+        result: Optional[EvaluatorOutput] = None
+        # A reply that does not parse as EvaluatorOutput is retried once
+        for _ in range(EVALUATOR_ATTEMPTS):
+            output = await self.evaluator_llm.ainvoke(messages)
+            tokens += _tokens(output["raw"])
+            result = output["parsed"]
+            if result is not None:
+                break
+        if result is None:
+            raw = getattr(output["raw"], "content", "") or str(output.get("parsing_error") or "no verdict")
+            result = EvaluatorOutput(
+                feedback=f"The evaluation could not be read, so the result needs your review. Evaluator said: {clip(str(raw), MESSAGE_CHARS)}",
+                success_criteria_met=False,
+                user_input_needed=True,
+            )
 
         return {
             "messages": [AIMessage(content=f"Evaluator: {result.feedback}")],
             "feedback_on_work": result.feedback,
             "success_criteria_met": result.success_criteria_met,
             "user_input_needed": result.user_input_needed,
+            "tokens_used": tokens,
         }
 
     def evaluation_router(self, state: AgentState) -> str:
         if state["success_criteria_met"] or state["user_input_needed"]:
             return END
+        if self.budget.exhausted(state):
+            return "budget"
         return "worker"
 
+    def budget_stop(self, state: AgentState) -> Dict[str, Any]:
+        """End a superstep that ran out of budget with the best answer so far and a budget report."""
+        reason = self.budget.exhausted(state) or "budget exhausted"
+        messages: List[Any] = []
+        last = state["messages"][-1]
+        # Tool calls the worker asked for but will not get must still be answered, or the thread is unusable
+        for tc in getattr(last, "tool_calls", None) or []:
+            messages.append(ToolMessage(content="Skipped: superstep budget exhausted", tool_call_id=tc["id"], name=tc["name"]))
+
+        best = None
+        for m in reversed(state["messages"]):
+            if isinstance(m, HumanMessage):
+                break
+            if isinstance(m, AIMessage) and isinstance(m.content, str) and m.content.strip() and not m.content.startswith("Evaluator:"):
+                best = m.content
+                break
+        report = (
+            f"Budget report: stopped because the agent {reason} "
+            f"({state.get('iterations', 0)} iterations, {time.time() - state.get('started_at', time.time()):.0f}s, "
+            f"{state.get('tokens_used', 0)} tokens)."
+        )
+        answer = best or "I ran out of budget before reaching an answer."
+        messages.append(AIMessage(content=f"{answer}\n\n---\n{report}"))
+        return {"messages": messages, "budget_exhausted": report}
+
     async def _build_graph(self):
         builder = StateGraph(AgentState)
 
         builder.add_node("worker", self.worker)
-        builder.add_node("tools", SafeToolNode(tools=self.tools))
+        builder.add_node("tools", SafeToolNode(self.tools, resolve=self.sessions.get))
         builder.add_node("evaluator", self.evaluator)
+        builder.add_node("budget", self.budget_stop)
 
         builder.add_conditional_edges("worker", self.worker_router)
         builder.add_edge("tools", "worker")
         builder.add_conditional_edges("evaluator", self.evaluation_router)
+        builder.add_edge("budget", END)
         builder.add_edge(START, "worker")
 
         self.graph = builder.compile(checkpointer=self.memory)
 
-    async def run_superstep(self, message: List[Dict], success_criteria: str, history: List[Dict]) -> List[Dict]:
+
+_runtime: Optional[NexusRuntime] = None
+_runtime_lock = asyncio.Lock()
+
+
+async def get_runtime() -> NexusRuntime:
+    """The process-wide runtime, built on first use."""
+    global _runtime
+    async with _runtime_lock:
+        if _runtime is None:
+            runtime = NexusRuntime()
+            await runtime.setup()
+            _runtime = runtime
+    return _runtime
+
+
+class NexusAgent:
+    """One user's session: a checkpoint thread and its own tools, running on the shared NexusRuntime.
+
+    Setting up a session is cheap; its browser context and Python worker are only leased on first use.
+    """
+    def __init__(self, agent_id: Optional[str] = None, runtime: Optional[NexusRuntime] = None):
+        """Pass the agent_id of an earlier session to resume its conversation from the checkpointer."""
+        self.agent_id = agent_id or str(uuid.uuid4())
+        self.runtime = runtime
+        self.graph = None
+        self.tools: Optional[SessionTools] = None
+
+    async def setup(self):
+        if self.runtime is None:
+            self.runtime = await get_runtime()
+        self.graph = self.runtime.graph
+        self.tools = SessionTools(self.agent_id)
+        self.runtime.sessions[self.agent_id] = self.tools
+
+    async def _start_superstep(self, message: List[Dict], success_criteria: str, history: List[Dict]) -> tuple:
         config = {"configurable": {"thread_id": self.agent_id}}
+        # The checkpointer already holds this thread's earlier messages; only seed history for a new thread
+        snapshot = await self.graph.aget_state(config)
         initial_state = {
-            "messages": history + message,
+            "messages": message if snapshot.values.get("messages") else history + message,
             "success_criteria": success_criteria,
             "feedback_on_work": None,
             "success_criteria_met": False,
             "user_input_needed": False,
+            "iterations": 0,
+            "tokens_used": 0,
+            "started_at": time.time(),
+            "budget_exhausted": None,
         }
 
-        result = await self.graph.ainvoke(initial_state, config)
+        self.tools.touch()
+        return initial_state, config
 
+    async def run_superstep(self, message: List[Dict], success_criteria: str, history: List[Dict]) -> List[Dict]:
+        initial_state, config = await self._start_superstep(message, success_criteria, history)
+        result = await self.graph.ainvoke(initial_state, config)
+        return self._display_messages(result["messages"])
+
+    async def run_superstep_stream(
+        self, message: List[Dict], success_criteria: str, history: List[Dict]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Run one superstep, yielding events as they happen instead of waiting for the whole loop.
+
+        Event types: "token" (content), "tool_start" (name, args), "tool_end" (name, content),
+        "tool_output" (name, content – output printed while a tool runs), "verdict" (feedback,
+        success_criteria_met, user_input_needed), "budget" (report) and finally "done" (messages, the same
+        display messages run_superstep returns).
+        """
+        initial_state, config = await self._start_superstep(message, success_criteria, history)
+        async for mode, chunk in self.graph.astream(initial_state, config, stream_mode=["messages", "updates", "custom"]):
+            if mode == "custom":
+                yield chunk
+                continue
+            if mode == "messages":
+                token, metadata = chunk
+                if metadata.get("langgraph_node") == "worker" and isinstance(token.content, str) and token.content:
+                    yield {"type": "token", "content": token.content}
+                continue
+            for node, update in chunk.items():
+                update = update or {}
+                if node == "worker":
+                    for m in update.get("messages", []):
+                        for tc in getattr(m, "tool_calls", None) or []:
+                            yield {"type": "tool_start", "name": tc["name"], "args": tc["args"]}
+                elif node == "tools":
+                    for m in update.get("messages", []):
+                        yield {"type": "tool_end", "name": m.name, "content": str(m.content)}
+                elif node == "evaluator":
+                    yield {
+                        "type": "verdict",
+                        "feedback": update.get("feedback_on_work"),
+                        "success_criteria_met": update.get("success_criteria_met", False),
+                        "user_input_needed": update.get("user_input_needed", False),
+                    }
+                elif node == "budget":
+                    yield {"type": "budget", "report": update.get("budget_exhausted")}
+            self.tools.touch()
+
+        snapshot = await self.graph.aget_state(config)
+        yield {"type": "done", "messages": self._display_messages(snapshot.values.get("messages", []))}
+
+    @staticmethod
+    def _display_messages(messages: List[Any]) -> List[Dict]:
         # Return only user/assistant messages (filter out internal evaluator messages)
         display_messages = []
-        for m in result["messages"]:
+        for m in messages:
             if isinstance(m, HumanMessage):
                 display_messages.append({"role": "user", "content": m.content})
             elif isinstance(m, AIMessage) and not m.content.startswith("Evaluator:"):
                 display_messages.append({"role": "assistant", "content": m.content})
-
         return display_messages
 
-    async def cleanup(self):
-        """Gracefully close browser and Playwright."""
-        if self.browser:
-            await self.browser.close()
-        if self.playwright:
-            await self.playwright.stop()
\ No newline at end of file
+    async def history(self) -> List[Dict]:
+        """The stored conversation of this session, for redisplaying a resumed session."""
+        snapshot = await self.graph.aget_state({"configurable": {"thread_id": self.agent_id}})
+        return self._display_messages(snapshot.values.get("messages", []))
+
+    async def cleanup(self, forget: bool = False):
+        """Return this session's browser context and Python worker to their pools (the shared runtime stays up).
+
+        The conversation stays in the checkpointer so the session can be resumed, unless forget is set.
+        """
+        if self.runtime is None:
+            return
+        # A newer agent for the same thread may be registered by now; its tools and contexts are not ours to drop
+        if self.runtime.sessions.get(self.agent_id) is self.tools:
+            del self.runtime.sessions[self.agent_id]
+            self.runtime.evaluator_contexts.pop(self.agent_id, None)
+            self.runtime.worker_window.forget(self.agent_id)
+        if self.tools:
+            await self.tools.close()
+        if forget:
+            await self.runtime.memory.forget(self.agent_id)
\ No newline at end of file
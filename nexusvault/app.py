@@ -2,57 +2,236 @@
 import gradio as gr
 import nest_asyncio
 import asyncio
-from agent import NexusAgent
+import os
+import time
+import uuid
+from agent import NexusAgent, DEFAULT_SUCCESS_CRITERIA
 
 nest_asyncio.apply()
 
-nexus: NexusAgent | None = None
+MAX_SESSIONS = int(os.getenv("NEXUS_MAX_SESSIONS", "100"))
+SESSION_IDLE_TTL = 30 * 60  # seconds before an unused session's browser context and Python worker are freed
+GREETING = [{"role": "assistant", "content": "Hello! I'm Nexus, your AI co-worker. How can I help you today?"}]
+BUSY = {"role": "assistant", "content": "Nexus is at capacity right now. Please try again in a few minutes."}
 
 
-def free_resources() -> None:
-    """Clean up browser and Playwright instances when resetting."""
-    global nexus
-    if nexus and hasattr(nexus, "cleanup"):
+class SessionManager:
+    """Nexus sessions keyed by a client id kept in the browser, all running on one shared runtime.
+
+    A session is created on first use, freed after SESSION_IDLE_TTL without activity (its conversation stays
+    in the checkpointer) and refused while MAX_SESSIONS are active. Each session runs one superstep at a time
+    (see lock()). Setups and cleanups run as tasks, outside the manager's lock; a session id is not set up again
+    until the cleanup of its previous agent has finished, since the pools key their leases by that id.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, idle_ttl: float = SESSION_IDLE_TTL):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.sessions: dict[str, NexusAgent] = {}
+        self.last_used: dict[str, float] = {}
+        self._setups: dict[str, asyncio.Task] = {}
+        self._closing: dict[str, asyncio.Task] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._cleanups: set[asyncio.Task] = set()
+        self._lock = asyncio.Lock()
+
+    def admits(self, session_id: str) -> bool:
+        """Whether a request from this session would be served right now."""
+        self._evict_idle()
+        return session_id in self.sessions or len(self.sessions) < self.max_sessions
+
+    async def get(self, session_id: str) -> NexusAgent | None:
+        """The session's agent, created if needed, or None when at capacity."""
+        while True:
+            async with self._lock:
+                if not self.admits(session_id):
+                    return None
+                closing = self._closing.get(session_id)
+                if closing is None:
+                    if session_id not in self.sessions:
+                        # Claim the slot now; the setup (the first one builds the shared runtime) runs outside the lock
+                        agent = NexusAgent(agent_id=session_id)
+                        self.sessions[session_id] = agent
+                        self._setups[session_id] = asyncio.create_task(agent.setup())
+                    agent = self.sessions[session_id]
+                    setup = self._setups[session_id]
+                    self.touch(session_id)
+                    break
+            # The previous agent (evicted or unloaded) is still releasing the leases held under this id
+            await asyncio.wait({closing})
         try:
-            asyncio.create_task(nexus.cleanup())
+            await asyncio.shield(setup)
+        except Exception:
+            if self.sessions.get(session_id) is agent:
+                self.close(session_id)
+            raise
+        return agent
+
+    def lock(self, session_id: str) -> asyncio.Lock:
+        """Held while the session runs a superstep or is reset, so two never run on the same thread at once."""
+        return self._locks.setdefault(session_id, asyncio.Lock())
+
+    def touch(self, session_id: str) -> None:
+        self.last_used[session_id] = time.monotonic()
+
+    def close(self, session_id: str, forget: bool = False) -> asyncio.Task | None:
+        """Free the session's resources in the background; forget also deletes the stored conversation."""
+        agent = self.sessions.pop(session_id, None)
+        setup = self._setups.pop(session_id, None)
+        self.last_used.pop(session_id, None)
+        lock = self._locks.get(session_id)
+        if lock and not lock.locked():
+            del self._locks[session_id]
+        if agent is None:
+            return None
+        task = asyncio.create_task(self._cleanup(agent, setup, forget))
+        self._cleanups.add(task)
+        self._closing[session_id] = task
+        task.add_done_callback(lambda task: self._closed(session_id, task))
+        return task
+
+    def _closed(self, session_id: str, task: asyncio.Task) -> None:
+        self._cleanups.discard(task)
+        if self._closing.get(session_id) is task:
+            del self._closing[session_id]
+
+    async def _cleanup(self, agent: NexusAgent, setup: asyncio.Task | None, forget: bool) -> None:
+        try:
+            if setup:
+                # A setup still running would register the session again after this cleanup
+                await asyncio.gather(setup, return_exceptions=True)
+            await agent.cleanup(forget=forget)
         except Exception as e:
             print(f"Cleanup error: {e}")
-    nexus = None
 
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        for session_id, last_used in list(self.last_used.items()):
+            if now - last_used > self.idle_ttl and not self.lock(session_id).locked():
+                print(f"Evicting idle session {session_id}")
+                self.close(session_id)
+
+    def stats(self) -> dict:
+        return {"active": len(self.sessions), "max": self.max_sessions, "pending_cleanups": len(self._cleanups)}
+
+    async def shutdown(self) -> None:
+        for session_id in list(self.sessions):
+            self.close(session_id)
+        await asyncio.gather(*self._cleanups, return_exceptions=True)
 
-async def setup() -> tuple[NexusAgent, list[dict]]:
-    """Initialize a fresh Nexus agent on app load."""
-    global nexus
-    free_resources()
-    nexus = NexusAgent()
-    await nexus.setup()
-    return nexus, [{"role": "assistant", "content": "Hello! I'm Nexus, your AI co-worker. How can I help you today?"}]
+
+sessions = SessionManager()
+# Gradio session (one per page load) -> the client id it belongs to, for closing the session on unload
+clients: dict[str, str] = {}
+
+
+async def setup(client_id: str | None, request: gr.Request) -> tuple[str, list[dict]]:
+    """Open (or resume) this browser's Nexus agent on app load.
+
+    The client id lives in the browser's local storage, so a reload resumes the same conversation; Gradio's
+    session_hash changes on every page load.
+    """
+    client_id = client_id or str(uuid.uuid4())
+    clients[request.session_hash] = client_id
+    agent = await sessions.get(client_id)
+    if agent is None:
+        return client_id, [BUSY]
+    return client_id, await agent.history() or GREETING
+
+
+TOOL_OUTPUT_PREVIEW = 500
 
 
 async def process_message(
-    agent: NexusAgent | None,
     message: str,
     success_criteria: str,
-    history: list[dict]
-) -> tuple[list[dict], NexusAgent | None]:
-    """Process user message through one full superstep."""
-    if not agent or not message.strip():
-        return history, agent
+    history: list[dict],
+    client_id: str
+):
+    """Process user message through one full superstep, showing tokens, tool calls and verdicts as they arrive."""
+    if not message.strip() or not client_id:
+        yield history
+        return
+    async with sessions.lock(client_id):
+        async for chat in _run_superstep(message, success_criteria, history, client_id):
+            yield chat
+
+
+async def _run_superstep(message: str, success_criteria: str, history: list[dict], client_id: str):
+    agent = await sessions.get(client_id)
+    if agent is None:
+        yield history + [BUSY]
+        return
 
     formatted_history = [{"role": m["role"], "content": m["content"]} for m in history]
-    updated_chat = await agent.run_superstep(
+    chat = formatted_history + [{"role": "user", "content": message}]
+    draft = None  # the assistant reply currently being streamed
+    live_output = None  # output of the tool currently running
+    yield chat
+
+    async for event in agent.run_superstep_stream(
         [{"role": "user", "content": message}],
-        success_criteria or "Provide a clear and accurate answer.",
+        success_criteria or DEFAULT_SUCCESS_CRITERIA,
         formatted_history
-    )
-    return updated_chat, agent
+    ):
+        kind = event["type"]
+        if kind == "token":
+            if draft is None:
+                draft = {"role": "assistant", "content": ""}
+                chat.append(draft)
+            draft["content"] += event["content"]
+        elif kind == "tool_start":
+            draft = None
+            chat.append({
+                "role": "assistant",
+                "content": f"`{event['args']}`",
+                "metadata": {"title": f"Using {event['name']}"}
+            })
+        elif kind == "tool_output":
+            if live_output is None:
+                live_output = {"role": "assistant", "content": "", "metadata": {"title": f"{event['name']} output"}}
+                chat.append(live_output)
+            live_output["content"] += event["content"]
+        elif kind == "tool_end":
+            live_output = None
+            output = event["content"]
+            if len(output) > TOOL_OUTPUT_PREVIEW:
+                output = output[:TOOL_OUTPUT_PREVIEW] + "…"
+            chat.append({"role": "assistant", "content": output, "metadata": {"title": f"{event['name']} finished"}})
+        elif kind == "verdict":
+            draft = None
+            title = "Evaluator: criteria met" if event["success_criteria_met"] else "Evaluator: needs more work"
+            chat.append({"role": "assistant", "content": event["feedback"] or "", "metadata": {"title": title}})
+        elif kind == "budget":
+            draft = None
+            chat.append({"role": "assistant", "content": event["report"] or "", "metadata": {"title": "Budget exhausted"}})
+        elif kind == "done":
+            # Swap the live view for the final conversation
+            chat = event["messages"]
+        sessions.touch(client_id)
+        yield chat
+
+
+async def reset(client_id: str) -> tuple[str, str, list]:
+    """Reset conversation; the session gets a fresh agent on its next message."""
+    if not client_id:
+        return "", "", GREETING
+    # Waits for a running superstep. The session is loaded (it may have been evicted) so its stored conversation
+    # is deleted too, and the deletion finishes before the same thread id can be used again
+    async with sessions.lock(client_id):
+        await sessions.get(client_id)
+        cleanup = sessions.close(client_id, forget=True)
+        if cleanup:
+            await cleanup
+    return "", "", GREETING
 
 
-async def reset() -> tuple[str, str, list, None]:
-    """Reset conversation and create new agent instance."""
-    global nexus
-    free_resources()
-    return "", "", [], None
+async def close_session(request: gr.Request) -> None:
+    """Free the session's resources when its browser tab goes away (the conversation can still be resumed)."""
+    client_id = clients.pop(request.session_hash, None)
+    # Another tab of the same browser may still be using it
+    if client_id and client_id not in clients.values():
+        sessions.close(client_id)
 
 
 # ==============================================================================
@@ -70,8 +249,8 @@ with gr.Blocks(
     """
 ) as ui:
     gr.Markdown("# Nexus – Your AI Co-Worker")
+    client_id = gr.BrowserState(None, storage_key="nexus_client_id")
 
-    state = gr.State()  # Holds the NexusAgent instance
     chatbot = gr.Chatbot(
         height=520,
         type="messages",
@@ -99,16 +278,17 @@ with gr.Blocks(
         reset_button = gr.Button("Reset Session", variant="stop", size="lg")
         go_button = gr.Button("Go!", variant="primary", size="lg")
 
-    # Initial load
-    ui.load(setup, outputs=[state, chatbot])
+    # Initial load and tab close
+    ui.load(setup, inputs=[client_id], outputs=[client_id, chatbot])
+    ui.unload(close_session)
 
     # Input handlers
-    message.submit(process_message, [state, message, success_criteria, chatbot], [chatbot, state])
-    success_criteria.submit(process_message, [state, message, success_criteria, chatbot], [chatbot, state])
-    go_button.click(process_message, [state, message, success_criteria, chatbot], [chatbot, state])
+    message.submit(process_message, [message, success_criteria, chatbot, client_id], [chatbot])
+    success_criteria.submit(process_message, [message, success_criteria, chatbot, client_id], [chatbot])
+    go_button.click(process_message, [message, success_criteria, chatbot, client_id], [chatbot])
 
     # Reset
-    reset_button.click(reset, outputs=[message, success_criteria, chatbot, state])
+    reset_button.click(reset, inputs=[client_id], outputs=[message, success_criteria, chatbot])
 
 if __name__ == "__main__":
     ui.launch(inbrowser=True)
\ No newline at end of file
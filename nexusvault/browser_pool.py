@@ -0,0 +1,177 @@
+# browser_pool.py
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from playwright.async_api import Browser, BrowserContext, Page, Playwright, async_playwright
+
+HEADLESS = True
+MAX_CONTEXTS = 32
+WARM_CONTEXTS = 2
+IDLE_TTL = 15 * 60  # seconds a session's context may sit unused before it is closed
+REAP_INTERVAL = 60
+
+
+class BrowserLease:
+    """One session's isolated browser context."""
+
+    def __init__(self, session_id: str, context: BrowserContext):
+        self.session_id = session_id
+        self.context = context
+        self.last_used = time.monotonic()
+
+    def touch(self) -> None:
+        self.last_used = time.monotonic()
+
+
+class BrowserPool:
+    """Process-wide Playwright browser handing out one isolated BrowserContext per session.
+
+    Sessions reach their context through page(), which leases a fresh one when the reaper has closed an idle
+    session's context, so a session's browser tools keep working for the whole session.
+    """
+
+    def __init__(
+        self,
+        headless: bool = HEADLESS,
+        max_contexts: int = MAX_CONTEXTS,
+        warm_contexts: int = WARM_CONTEXTS,
+        idle_ttl: float = IDLE_TTL,
+    ):
+        self.headless = headless
+        self.max_contexts = max_contexts
+        self.warm_contexts = warm_contexts
+        self.idle_ttl = idle_ttl
+        self.playwright: Optional[Playwright] = None
+        self.browser: Optional[Browser] = None
+        self.leases: Dict[str, BrowserLease] = {}
+        self._warm: List[BrowserContext] = []
+        self._lock = asyncio.Lock()
+        self._released = asyncio.Condition()
+        self._reaper: Optional[asyncio.Task] = None
+        self._refill: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        async with self._lock:
+            if self.browser and self.browser.is_connected():
+                return
+            if self.browser:
+                await self._discard_browser()
+            self.playwright = await async_playwright().start()
+            self.browser = await self.playwright.chromium.launch(
+                headless=self.headless,
+                args=["--no-sandbox", "--disable-setuid-sandbox", "--start-maximized"]
+            )
+            self._reaper = asyncio.create_task(self._reap_idle())
+        self._schedule_refill()
+
+    async def _discard_browser(self) -> None:
+        """Forget a browser that disconnected: its contexts died with it, so their sessions lease new ones."""
+        print("Browser disconnected; starting a new one")
+        for task in (self._reaper, self._refill):
+            if task:
+                task.cancel()
+        self._reaper = self._refill = None
+        self.leases.clear()
+        self._warm.clear()
+        try:
+            await self.playwright.stop()
+        except Exception as e:
+            print(f"Playwright stop error: {e}")
+        async with self._released:
+            self._released.notify_all()
+
+    async def _new_context(self) -> BrowserContext:
+        context = await self.browser.new_context(
+            viewport={"width": 1920, "height": 1080},
+            java_script_enabled=True,
+            bypass_csp=True
+        )
+        # Hide automation flags
+        await context.add_init_script("Object.defineProperty(navigator, 'webdriver', {get: () => false});")
+        context.set_default_timeout(90_000)
+        await context.new_page()  # pre-warm
+        return context
+
+    async def _fill_warm(self) -> None:
+        while len(self._warm) < self.warm_contexts and len(self.leases) + len(self._warm) < self.max_contexts:
+            self._warm.append(await self._new_context())
+
+    def _schedule_refill(self) -> None:
+        # The only caller of _fill_warm, so one fill runs at a time and the warm pool does not overshoot
+        if self._refill is None or self._refill.done():
+            self._refill = asyncio.create_task(self._fill_warm())
+
+    async def lease(self, session_id: str) -> BrowserLease:
+        """Return the session's context, handing out a warm one (or a new one) on first use."""
+        await self.start()
+        async with self._released:
+            while session_id not in self.leases:
+                if self._warm:
+                    context = self._warm.pop()
+                elif len(self.leases) < self.max_contexts:
+                    context = await self._new_context()
+                else:
+                    if not await self._evict_oldest_idle():
+                        await self._released.wait()
+                    continue
+                self.leases[session_id] = BrowserLease(session_id, context)
+                self._schedule_refill()
+        lease = self.leases[session_id]
+        lease.touch()
+        return lease
+
+    async def page(self, session_id: str) -> Page:
+        """The session's current page (the last one opened in its context)."""
+        context = (await self.lease(session_id)).context
+        return context.pages[-1] if context.pages else await context.new_page()
+
+    async def release(self, session_id: str) -> None:
+        lease = self.leases.pop(session_id, None)
+        if lease is None:
+            return
+        try:
+            await lease.context.close()
+        except Exception as e:
+            print(f"Browser context close error: {e}")
+        async with self._released:
+            self._released.notify()
+        self._schedule_refill()
+
+    async def _evict_oldest_idle(self) -> bool:
+        now = time.monotonic()
+        idle = [lease for lease in self.leases.values() if now - lease.last_used > self.idle_ttl]
+        if not idle:
+            return False
+        oldest = min(idle, key=lambda lease: lease.last_used)
+        self.leases.pop(oldest.session_id, None)
+        await oldest.context.close()
+        return True
+
+    async def _reap_idle(self) -> None:
+        while True:
+            await asyncio.sleep(REAP_INTERVAL)
+            now = time.monotonic()
+            for lease in list(self.leases.values()):
+                if now - lease.last_used > self.idle_ttl:
+                    print(f"Closing idle browser context for session {lease.session_id}")
+                    await self.release(lease.session_id)
+
+    async def close(self) -> None:
+        """Shut down every context, the browser and Playwright."""
+        if self._reaper:
+            self._reaper.cancel()
+        for session_id in list(self.leases):
+            await self.release(session_id)
+        for context in self._warm:
+            await context.close()
+        self._warm.clear()
+        if self.browser:
+            await self.browser.close()
+        if self.playwright:
+            await self.playwright.stop()
+        self.browser = None
+        self.playwright = None
+
+
+browser_pool = BrowserPool()
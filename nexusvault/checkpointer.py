@@ -0,0 +1,146 @@
+# checkpointer.py
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import aiosqlite
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+CHECKPOINT_PATH = os.getenv("NEXUS_CHECKPOINT_PATH", "checkpoints.db")
+KEEP_CHECKPOINTS = 20  # newest checkpoints kept per thread; older ones are deleted
+COMPACT_EVERY = 10  # checkpoint writes per thread between compactions
+CACHE_SIZE = 256  # threads whose latest checkpoint is held in memory
+
+
+class CompactingSqliteSaver(AsyncSqliteSaver):
+    """SQLite checkpointer that prunes old checkpoints and caches each active thread's latest one.
+
+    Only the newest KEEP_CHECKPOINTS checkpoints of a thread survive compaction, so the database grows with
+    the number of sessions rather than the number of steps. Reads of a thread's latest checkpoint, which
+    happen on every superstep, are answered from an LRU cache that any write to the thread invalidates.
+    """
+
+    def __init__(
+        self,
+        conn: aiosqlite.Connection,
+        keep: int = KEEP_CHECKPOINTS,
+        compact_every: int = COMPACT_EVERY,
+        cache_size: int = CACHE_SIZE,
+    ):
+        super().__init__(conn)
+        self.keep = keep
+        self.compact_every = compact_every
+        self.cache_size = cache_size
+        self._latest: "OrderedDict[Tuple[str, str], CheckpointTuple]" = OrderedDict()
+        self._writes_since_compaction: Dict[Tuple[str, str], int] = {}
+        # Bumped around every write to a thread, so a read that overlapped a write is not cached
+        self._versions: Dict[str, int] = {}
+
+    @staticmethod
+    def _key(config: RunnableConfig) -> Tuple[str, str]:
+        configurable = config["configurable"]
+        return str(configurable["thread_id"]), configurable.get("checkpoint_ns", "")
+
+    def _invalidate(self, key: Tuple[str, str]) -> None:
+        self._latest.pop(key, None)
+        self._versions[key[0]] = self._versions.get(key[0], 0) + 1
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        if config["configurable"].get("checkpoint_id"):
+            return await super().aget_tuple(config)
+        key = self._key(config)
+        if key in self._latest:
+            self._latest.move_to_end(key)
+            return self._latest[key]
+        version = self._versions.get(key[0], 0)
+        checkpoint = await super().aget_tuple(config)
+        if checkpoint is not None and self._versions.get(key[0], 0) == version:
+            self._latest[key] = checkpoint
+            while len(self._latest) > self.cache_size:
+                self._latest.popitem(last=False)
+        return checkpoint
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        key = self._key(config)
+        self._invalidate(key)
+        next_config = await super().aput(config, checkpoint, metadata, new_versions)
+        self._invalidate(key)
+        self._writes_since_compaction[key] = self._writes_since_compaction.get(key, 0) + 1
+        if self._writes_since_compaction[key] >= self.compact_every:
+            self._writes_since_compaction[key] = 0
+            await self.compact(*key)
+        return next_config
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        key = self._key(config)
+        self._invalidate(key)
+        await super().aput_writes(config, writes, task_id, task_path)
+        self._invalidate(key)
+
+    async def compact(self, thread_id: str, checkpoint_ns: str = "") -> None:
+        """Delete all but the newest `keep` checkpoints of a thread, and their pending writes."""
+        await self.setup()
+        async with self.lock:
+            await self.conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN "
+                "(SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT ?)",
+                (thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.keep),
+            )
+            await self.conn.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN "
+                "(SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?)",
+                (thread_id, checkpoint_ns, thread_id, checkpoint_ns),
+            )
+            await self.conn.commit()
+
+    async def forget(self, thread_id: str) -> None:
+        """Remove every checkpoint of a thread."""
+        await self.setup()
+        async with self.lock:
+            await self.conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            await self.conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+            await self.conn.commit()
+        self._versions[thread_id] = self._versions.get(thread_id, 0) + 1
+        for key in [key for key in self._latest if key[0] == thread_id]:
+            del self._latest[key]
+        for key in [key for key in self._writes_since_compaction if key[0] == thread_id]:
+            del self._writes_since_compaction[key]
+
+
+_checkpointer: Optional[CompactingSqliteSaver] = None
+_lock = asyncio.Lock()
+
+
+async def get_checkpointer(path: str = CHECKPOINT_PATH) -> CompactingSqliteSaver:
+    """The process-wide checkpointer, opened on first use and shared by every session."""
+    global _checkpointer
+    async with _lock:
+        if _checkpointer is None:
+            conn = await aiosqlite.connect(path)
+            await conn.execute("PRAGMA journal_mode=WAL")
+            _checkpointer = CompactingSqliteSaver(conn)
+            await _checkpointer.setup()
+    return _checkpointer
+
+
+async def close_checkpointer() -> None:
+    global _checkpointer
+    if _checkpointer is not None:
+        await _checkpointer.conn.close()
+        _checkpointer = None
@@ -0,0 +1,237 @@
+# context.py
+import hashlib
+from collections import OrderedDict, deque
+from typing import Any, Deque, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+CHARS_PER_TOKEN = 4
+EVALUATOR_TOKEN_BUDGET = 6_000
+TOOL_OUTPUT_CHARS = 1_500
+MESSAGE_CHARS = 4_000
+WORKER_TOKEN_BUDGET = 12_000
+RECENT_MESSAGES = 6  # the newest messages always go to the worker verbatim
+COMPACT_TOOL_CHARS = 400
+STORED_TOOL_OUTPUTS = 1_000
+COMPACTED_MESSAGES = 5_000
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) – good enough for budgeting."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def clip(text: str, limit: int) -> str:
+    """Keep the head and tail of long text, noting how much was cut from the middle."""
+    if len(text) <= limit:
+        return text
+    half = limit // 2
+    return f"{text[:half]}\n…[{len(text) - limit} characters omitted]…\n{text[-half:]}"
+
+
+def message_key(message: Any) -> str:
+    return getattr(message, "id", None) or str(id(message))
+
+
+def render_message(message: Any) -> str:
+    """One line of evaluator context for a message, with tool output and long replies clipped."""
+    name = type(message).__name__
+    if isinstance(message, ToolMessage):
+        return f"ToolMessage ({message.name}): {clip(str(message.content), TOOL_OUTPUT_CHARS)}"
+    if isinstance(message, AIMessage) and message.tool_calls:
+        calls = ", ".join(f"{tc['name']}({clip(str(tc['args']), 200)})" for tc in message.tool_calls)
+        text = f" {clip(str(message.content), MESSAGE_CHARS)}" if message.content else ""
+        return f"{name}: [called {calls}]{text}"
+    return f"{name}: {clip(str(message.content), MESSAGE_CHARS)}"
+
+
+class EvaluatorContext:
+    """Running, token-budgeted digest of one conversation for the evaluator.
+
+    Each message is rendered once. Messages added since the previous evaluation are listed separately,
+    and the digest of everything before them is cached as a stable prompt prefix. The digest and the new
+    messages together stay within the budget: the oldest digest lines are dropped first, but never the
+    user's latest request, which is what the current superstep is judged against.
+    """
+
+    def __init__(self, budget: int = EVALUATOR_TOKEN_BUDGET):
+        self.budget = budget
+        self.lines: Deque[Tuple[str, str, int]] = deque()
+        self.tokens = 0
+        self.dropped = 0
+        self.seen: set = set()
+        self.request_key: Optional[str] = None
+        self._pending: List[Tuple[str, str, int]] = []
+        self._prefix: Optional[str] = None
+
+    def update(self, messages: List[Any]) -> Tuple[str, str]:
+        """Take in the current messages and return (digest of earlier messages, messages new since last time)."""
+        # Everything that was new last time is now part of the digest
+        for key, text, tokens in self._pending:
+            self.lines.append((key, text, tokens))
+            self.tokens += tokens
+            self._prefix = None
+        self._pending = []
+        for message in messages:
+            key = message_key(message)
+            if key in self.seen or isinstance(message, SystemMessage):
+                continue
+            self.seen.add(key)
+            if isinstance(message, HumanMessage):
+                self.request_key = key
+            text = render_message(message)
+            self._pending.append((key, text, estimate_tokens(text)))
+        new, new_tokens = self._fit_new()
+        self._evict(self.budget - new_tokens)
+        return self.prefix(), new
+
+    def _fit_new(self) -> Tuple[str, int]:
+        """The new messages, dropping the oldest of them (never the request) if they alone exceed the budget."""
+        lines = list(self._pending)
+        limit = self.budget - sum(tokens for key, _, tokens in self.lines if key == self.request_key)
+        tokens = sum(line[2] for line in lines)
+        omitted = 0
+        while tokens > limit:
+            # The last line is the response being evaluated; it is always kept
+            droppable = [i for i, line in enumerate(lines[:-1]) if line[0] != self.request_key]
+            if not droppable:
+                break
+            tokens -= lines.pop(droppable[0])[2]
+            omitted += 1
+        texts = [text for _, text, _ in lines]
+        if omitted:
+            texts.insert(0, f"…[{omitted} of the new messages omitted]…")
+        return "\n".join(texts), tokens
+
+    def _evict(self, limit: int) -> None:
+        """Drop the oldest digest lines, except the latest request, until the digest fits in limit tokens."""
+        while self.tokens > limit:
+            i = next((i for i, line in enumerate(self.lines) if line[0] != self.request_key), None)
+            if i is None:
+                break
+            _, _, tokens = self.lines[i]
+            del self.lines[i]
+            self.tokens -= tokens
+            self.dropped += 1
+            self._prefix = None
+
+    def prefix(self) -> str:
+        if self._prefix is None:
+            lines = [text for _, text, _ in self.lines]
+            if self.dropped:
+                lines.insert(0, f"…[{self.dropped} earlier messages omitted]…")
+            self._prefix = "\n".join(lines) or "(nothing yet)"
+        return self._prefix
+
+
+class ToolOutputStore:
+    """Full tool outputs kept out of the prompt, retrievable by reference (least recently used dropped first).
+
+    Outputs belong to the thread that produced them; a session can only retrieve its own.
+    """
+
+    def __init__(self, max_items: int = STORED_TOOL_OUTPUTS):
+        self.max_items = max_items
+        self._items: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+
+    def put(self, thread_id: str, content: str) -> str:
+        ref = hashlib.sha1(content.encode("utf-8")).hexdigest()[:12]
+        self._items[(thread_id, ref)] = content
+        self._items.move_to_end((thread_id, ref))
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+        return ref
+
+    def get(self, thread_id: str, ref: str) -> Optional[str]:
+        content = self._items.get((thread_id, ref))
+        if content is not None:
+            self._items.move_to_end((thread_id, ref))
+        return content
+
+    def forget(self, thread_id: str) -> None:
+        for key in [key for key in self._items if key[0] == thread_id]:
+            del self._items[key]
+
+
+tool_output_store = ToolOutputStore()
+
+
+def message_tokens(message: Any) -> int:
+    tokens = estimate_tokens(str(message.content))
+    for tc in getattr(message, "tool_calls", None) or []:
+        tokens += estimate_tokens(str(tc["args"])) + 10
+    return tokens
+
+
+class WorkerWindow:
+    """Builds the worker's prompt within a token budget.
+
+    The newest messages are sent verbatim. Older tool outputs are swapped for short cached summaries that
+    point at the full text in the ToolOutputStore. If that is still too much, whole earlier turns (a user
+    message and everything after it) are dropped, so tool calls are never separated from their results, and
+    then the remaining tool outputs are shortened too, oldest first.
+
+    One window serves every session: cached summaries are kept per thread, at most max_compacted in all
+    (least recently used dropped first), and a thread's are cleared by forget() when its session closes.
+    """
+
+    def __init__(self, store: ToolOutputStore = tool_output_store, budget: int = WORKER_TOKEN_BUDGET,
+                 max_compacted: int = COMPACTED_MESSAGES):
+        self.store = store
+        self.budget = budget
+        self.max_compacted = max_compacted
+        self._compacted: "OrderedDict[Tuple[str, str], ToolMessage]" = OrderedDict()
+
+    def compact(self, thread_id: str, message: ToolMessage) -> ToolMessage:
+        key = (thread_id, message_key(message))
+        if key not in self._compacted:
+            content = str(message.content)
+            if len(content) <= COMPACT_TOOL_CHARS:
+                self._compacted[key] = message
+            else:
+                ref = self.store.put(thread_id, content)
+                summary = (
+                    f"[{message.name} output, {len(content)} characters, shortened; "
+                    f"call retrieve_tool_output(ref=\"{ref}\") for the full text]\n"
+                    f"{clip(content, COMPACT_TOOL_CHARS)}"
+                )
+                self._compacted[key] = ToolMessage(
+                    content=summary, tool_call_id=message.tool_call_id, name=message.name, id=message.id
+                )
+            while len(self._compacted) > self.max_compacted:
+                self._compacted.popitem(last=False)
+        self._compacted.move_to_end(key)
+        return self._compacted[key]
+
+    def forget(self, thread_id: str) -> None:
+        """Drop a thread's cached summaries and stored tool outputs."""
+        for key in [key for key in self._compacted if key[0] == thread_id]:
+            del self._compacted[key]
+        self.store.forget(thread_id)
+
+    def build(self, thread_id: str, system: SystemMessage, messages: List[Any]) -> List[Any]:
+        messages = [m for m in messages if not isinstance(m, SystemMessage)]
+        cutoff = len(messages) - RECENT_MESSAGES
+        window = [
+            self.compact(thread_id, m) if i < cutoff and isinstance(m, ToolMessage) else m
+            for i, m in enumerate(messages)
+        ]
+        turns = [i for i, m in enumerate(window) if isinstance(m, HumanMessage)]
+        tokens = message_tokens(system) + sum(message_tokens(m) for m in window)
+        dropped = 0
+        # Drop the oldest whole turns, always keeping the one in progress
+        while tokens > self.budget and len(turns) > 1:
+            start, end = turns[0] - dropped, turns[1] - dropped
+            tokens -= sum(message_tokens(m) for m in window[start:end])
+            del window[start:end]
+            dropped += end - start
+            turns.pop(0)
+        # A single long turn can still be over budget: shorten its newer tool outputs as well, oldest first
+        for i in range(max(0, cutoff - dropped), len(window)):
+            if tokens <= self.budget:
+                break
+            if isinstance(window[i], ToolMessage):
+                compacted = self.compact(thread_id, window[i])
+                tokens += message_tokens(compacted) - message_tokens(window[i])
+                window[i] = compacted
+        return [system] + window
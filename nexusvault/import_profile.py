@@ -0,0 +1,56 @@
+# import_profile.py
+"""Import-time report for Nexus modules.
+
+    python import_profile.py               # agent, tools and app
+    python import_profile.py tools --top 40
+
+Each module is imported in a fresh interpreter with `python -X importtime`, so caches from this process
+do not hide anything.
+"""
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+HERE = Path(__file__).resolve().parent
+
+
+def profile(module: str) -> Tuple[float, List[Tuple[int, int, str]]]:
+    """Wall-clock seconds to import the module, and (cumulative µs, self µs, name) for every import it made."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HERE, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        error = "\n".join(line for line in result.stderr.splitlines() if not line.startswith("import time:"))
+        raise RuntimeError(f"import {module} failed:\n{error[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return elapsed, rows
+
+
+def report(module: str, top: int = 25) -> str:
+    elapsed, rows = profile(module)
+    lines = [f"import {module}: {elapsed * 1000:.0f} ms wall clock, {len(rows)} modules imported"]
+    lines.append(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        lines.append(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show which imports make Nexus slow to start")
+    parser.add_argument("modules", nargs="*", default=["agent", "tools", "app"])
+    parser.add_argument("--top", type=int, default=25, help="How many of the slowest imports to list")
+    options = parser.parse_args()
+    for module in options.modules:
+        print(report(module, options.top))
+        print()
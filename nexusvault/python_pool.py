@@ -0,0 +1,175 @@
+# python_pool.py
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_worker.py")
+WARM_WORKERS = 2
+MAX_WORKERS = 16
+EXEC_TIMEOUT = 60  # seconds of wall-clock time per execution before the worker is killed
+STARTUP_TIMEOUT = 60
+IDLE_TTL = 15 * 60
+REAP_INTERVAL = 60
+LINE_LIMIT = 16 * 1024 * 1024  # largest single chunk of output read from a worker
+
+
+def sanitize_code(code: str) -> str:
+    """Strip the markdown fences models like to wrap code in."""
+    code = re.sub(r"^(\s|`)*(?i:python)?\s*", "", code)
+    return re.sub(r"(\s|`)*$", "", code)
+
+
+class WorkerDied(Exception):
+    pass
+
+
+class PythonWorker:
+    """One pre-started Python process, used by a single session at a time."""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+    @classmethod
+    async def start(cls) -> "PythonWorker":
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-u", WORKER_SCRIPT,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            limit=LINE_LIMIT,
+        )
+        worker = cls(process)
+        line = await asyncio.wait_for(process.stdout.readline(), STARTUP_TIMEOUT)
+        if not line:
+            raise WorkerDied("Python worker failed to start")
+        return worker
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None
+
+    async def run(self, code: str, timeout: float = EXEC_TIMEOUT) -> AsyncIterator[str]:
+        """Execute code, yielding its output as it is printed; raises TimeoutError or WorkerDied."""
+        async with self.lock:
+            self.last_used = time.monotonic()
+            self.process.stdin.write((json.dumps({"code": code}) + "\n").encode("utf-8"))
+            await self.process.stdin.drain()
+            deadline = time.monotonic() + timeout
+            while True:
+                line = await asyncio.wait_for(self.process.stdout.readline(), max(0.0, deadline - time.monotonic()))
+                if not line:
+                    raise WorkerDied("Python worker exited, most likely after hitting its CPU or memory limit")
+                message = json.loads(line)
+                if message["type"] == "output":
+                    yield message["text"]
+                elif message["type"] == "done":
+                    if message["error"]:
+                        yield message["error"]
+                    self.last_used = time.monotonic()
+                    return
+
+    def kill(self) -> None:
+        if self.alive:
+            self.process.kill()
+
+
+class PythonPool:
+    """Pre-started, pre-imported Python worker processes, one leased per session.
+
+    A session keeps its worker (and so its variables) until it is released, times out or crashes; workers
+    are never handed to another session.
+    """
+
+    def __init__(self, warm_workers: int = WARM_WORKERS, max_workers: int = MAX_WORKERS, idle_ttl: float = IDLE_TTL):
+        self.warm_workers = warm_workers
+        self.max_workers = max_workers
+        self.idle_ttl = idle_ttl
+        self.leases: Dict[str, PythonWorker] = {}
+        self._warm: List[PythonWorker] = []
+        self._released = asyncio.Condition()
+        self._refill: Optional[asyncio.Task] = None
+        self._reaper: Optional[asyncio.Task] = None
+
+    async def _fill_warm(self) -> None:
+        while len(self._warm) < self.warm_workers and len(self.leases) + len(self._warm) < self.max_workers:
+            self._warm.append(await PythonWorker.start())
+
+    def _schedule_refill(self) -> None:
+        if self._refill is None or self._refill.done():
+            self._refill = asyncio.create_task(self._fill_warm())
+
+    def start(self) -> None:
+        """Start warming workers and the idle reaper on the running event loop."""
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_idle())
+        self._schedule_refill()
+
+    async def lease(self, session_id: str) -> PythonWorker:
+        self.start()
+        async with self._released:
+            while session_id not in self.leases or not self.leases[session_id].alive:
+                self._warm = [worker for worker in self._warm if worker.alive]
+                if self._warm:
+                    worker = self._warm.pop()
+                elif len(self.leases) < self.max_workers:
+                    worker = await PythonWorker.start()
+                else:
+                    await self._released.wait()
+                    continue
+                self.leases[session_id] = worker
+                self._schedule_refill()
+        return self.leases[session_id]
+
+    async def release(self, session_id: str) -> None:
+        worker = self.leases.pop(session_id, None)
+        if worker is None:
+            return
+        worker.kill()
+        async with self._released:
+            self._released.notify()
+        self._schedule_refill()
+
+    async def run(self, session_id: str, code: str, timeout: float = EXEC_TIMEOUT) -> AsyncIterator[str]:
+        """Run code in the session's worker, yielding output as it arrives.
+
+        A worker that times out, is cancelled or dies is replaced, which resets the session's variables.
+        """
+        worker = await self.lease(session_id)
+        try:
+            async for chunk in worker.run(sanitize_code(code), timeout):
+                yield chunk
+        except asyncio.TimeoutError:
+            await self.release(session_id)
+            yield f"\nExecution timed out after {timeout}s; the Python session was restarted."
+        except WorkerDied as e:
+            await self.release(session_id)
+            yield f"\n{e}; the Python session was restarted."
+        except asyncio.CancelledError:
+            await self.release(session_id)
+            raise
+
+    async def _reap_idle(self) -> None:
+        while True:
+            await asyncio.sleep(REAP_INTERVAL)
+            now = time.monotonic()
+            for session_id, worker in list(self.leases.items()):
+                if now - worker.last_used > self.idle_ttl and not worker.lock.locked():
+                    print(f"Stopping idle Python worker for session {session_id}")
+                    await self.release(session_id)
+
+    async def close(self) -> None:
+        if self._reaper:
+            self._reaper.cancel()
+        for session_id in list(self.leases):
+            await self.release(session_id)
+        for worker in self._warm:
+            worker.kill()
+        self._warm.clear()
+
+
+python_pool = PythonPool()
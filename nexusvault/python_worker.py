@@ -0,0 +1,81 @@
+# python_worker.py
+"""Child process behind the Python_REPL tool.
+
+Reads one JSON request per line on stdin, runs the code in a namespace that persists between requests, and
+streams what it prints back as JSON lines. Heavy modules are imported before the first request so code
+starts instantly, and CPU and memory are capped with rlimits.
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import traceback
+
+try:
+    import resource
+except ImportError:  # not available on Windows; run without limits there
+    resource = None
+
+PRELOAD = ["numpy", "pandas", "math", "json", "re", "datetime", "collections", "statistics"]
+MEMORY_MB = int(os.getenv("NEXUS_PYTHON_MEMORY_MB", "1024"))
+CPU_SECONDS = int(os.getenv("NEXUS_PYTHON_CPU_SECONDS", "60"))
+
+
+def send(channel, message: dict) -> None:
+    channel.write(json.dumps(message) + "\n")
+    channel.flush()
+
+
+class OutputStream(io.TextIOBase):
+    """stdout/stderr replacement that forwards every write to the parent as it happens."""
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if text:
+            send(self.channel, {"type": "output", "text": text})
+        return len(text)
+
+
+def main() -> None:
+    channel = os.fdopen(os.dup(1), "w")
+    # Anything else writing to fd 1 (C extensions, subprocesses) goes to stderr instead of the protocol
+    os.dup2(2, 1)
+
+    for name in PRELOAD:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    if resource:
+        memory = MEMORY_MB * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+    namespace = {"__name__": "__main__"}
+    send(channel, {"type": "ready"})
+    for line in sys.stdin:
+        request = json.loads(line)
+        if resource:
+            # RLIMIT_CPU counts the whole process lifetime, so each request gets CPU_SECONDS more
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            soft = int(usage.ru_utime + usage.ru_stime) + CPU_SECONDS
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, resource.getrlimit(resource.RLIMIT_CPU)[1]))
+        stream = OutputStream(channel)
+        error = None
+        with contextlib.redirect_stdout(stream), contextlib.redirect_stderr(stream):
+            try:
+                exec(compile(request["code"], "<python_repl>", "exec"), namespace)
+            except MemoryError:
+                error = f"MemoryError: the {MEMORY_MB} MB memory limit was exceeded"
+            except BaseException:
+                error = traceback.format_exc()
+        send(channel, {"type": "done", "error": error})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# sandbox_files.py
+import asyncio
+import atexit
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+SANDBOX_DIR = os.getenv("NEXUS_SANDBOX_DIR", "sandbox")
+FLUSH_INTERVAL = 1.0  # seconds appends may sit in memory
+MAX_BUFFER_BYTES = 64 * 1024  # a file's buffer is flushed early once it grows past this
+READ_LENGTH = 4000
+
+
+class SandboxFiles:
+    """Async file service for the agent's sandbox directory.
+
+    Appends go into a per-file buffer that is written behind: every FLUSH_INTERVAL, when it passes
+    MAX_BUFFER_BYTES, before the file is read or overwritten, and on close. Overwrites go to a temporary file
+    that is renamed into place, so readers never see half a file. Every path must resolve inside the sandbox.
+
+    An append checks that its file can be written before it is buffered. If a later flush fails anyway, the
+    chunks stay buffered (and are retried) and the error is raised by the next call for that file.
+    """
+
+    def __init__(self, root: str = SANDBOX_DIR, flush_interval: float = FLUSH_INTERVAL,
+                 max_buffer_bytes: int = MAX_BUFFER_BYTES):
+        self.root = Path(root).resolve()
+        self.flush_interval = flush_interval
+        self.max_buffer_bytes = max_buffer_bytes
+        self._buffers: Dict[Path, List[bytes]] = {}
+        self._sizes: Dict[Path, int] = {}
+        self._errors: Dict[Path, OSError] = {}
+        self._locks: Dict[Path, asyncio.Lock] = {}
+        self._lock_users: Dict[Path, int] = {}
+        self._flusher: Optional[asyncio.Task] = None
+
+    def resolve(self, filename: str) -> Path:
+        path = (self.root / filename).resolve()
+        if self.root not in path.parents:
+            raise ValueError(f"{filename} is outside the sandbox")
+        return path
+
+    @asynccontextmanager
+    async def _locked(self, path: Path):
+        """Hold the path's lock; the lock is dropped once nobody holds or waits for it."""
+        lock = self._locks.setdefault(path, asyncio.Lock())
+        self._lock_users[path] = self._lock_users.get(path, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._lock_users[path] -= 1
+            if not self._lock_users[path]:
+                del self._lock_users[path]
+                del self._locks[path]
+
+    def _raise_error(self, path: Path) -> None:
+        """Raise (once) the error of a failed flush of this file."""
+        error = self._errors.pop(path, None)
+        if error:
+            raise OSError(f"Earlier appends to {path.name} are not written yet: {error}") from error
+
+    async def write(self, filename: str, content: str) -> None:
+        """Replace the file's contents atomically (appends still buffered for it are dropped)."""
+        path = self.resolve(filename)
+        async with self._locked(path):
+            self._raise_error(path)
+            chunks = self._buffers.pop(path, None)
+            size = self._sizes.pop(path, None)
+            try:
+                await asyncio.to_thread(self._replace, path, content.encode("utf-8"))
+            except BaseException:
+                if chunks:
+                    self._buffers[path] = chunks + self._buffers.get(path, [])
+                    self._sizes[path] = size + self._sizes.get(path, 0)
+                raise
+
+    async def append(self, filename: str, content: str) -> None:
+        path = self.resolve(filename)
+        data = content.encode("utf-8")
+        # Under the path's lock, so appends (and writes) of one file land in the order they were made
+        async with self._locked(path):
+            self._raise_error(path)
+            if path not in self._buffers:
+                # Later appends to the same buffer were checked by this one
+                await asyncio.to_thread(self._check_writable, path)
+            self._buffers.setdefault(path, []).append(data)
+            self._sizes[path] = self._sizes.get(path, 0) + len(data)
+        if self._sizes.get(path, 0) >= self.max_buffer_bytes:
+            await self._flush_path(path)
+            self._raise_error(path)
+        else:
+            self._start_flusher()
+
+    async def read(self, filename: str, offset: int = 0, length: int = READ_LENGTH) -> Tuple[str, int]:
+        """Up to `length` bytes of the file from `offset`, decoded, and the file's total size in bytes."""
+        path = self.resolve(filename)
+        await self._flush_path(path)
+        self._raise_error(path)
+        return await asyncio.to_thread(self._read_range, path, max(0, offset), max(0, length))
+
+    async def flush(self) -> None:
+        for path in list(self._buffers):
+            await self._flush_path(path)
+
+    async def close(self) -> None:
+        if self._flusher:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+
+    def flush_sync(self) -> None:
+        """Write out every buffer without an event loop (used at interpreter exit)."""
+        for path in list(self._buffers):
+            try:
+                self._append_bytes(path, b"".join(self._buffers.pop(path)))
+            except OSError as e:
+                print(f"Sandbox flush error, {path.name} not written: {e}")
+            self._sizes.pop(path, None)
+
+    async def _flush_path(self, path: Path) -> None:
+        """Write out the path's buffer; on failure the chunks are put back and the error kept for the next call."""
+        async with self._locked(path):
+            chunks = self._buffers.pop(path, None)
+            self._sizes.pop(path, None)
+            if not chunks:
+                return
+            try:
+                await asyncio.to_thread(self._append_bytes, path, b"".join(chunks))
+            except OSError as e:
+                # Ahead of anything appended while the write was running
+                chunks.extend(self._buffers.get(path, []))
+                self._buffers[path] = chunks
+                self._sizes[path] = sum(len(chunk) for chunk in chunks)
+                self._errors[path] = e
+
+    def _start_flusher(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_periodically())
+
+    async def _flush_periodically(self) -> None:
+        while self._buffers:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    @staticmethod
+    def _replace(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            # mkstemp creates the file owner-only; keep the replaced file's mode, or the usual 644
+            os.chmod(temporary, path.stat().st_mode & 0o777 if path.exists() else 0o644)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    @staticmethod
+    def _check_writable(path: Path) -> None:
+        """Raise if the file could not be appended to: it is a directory, or it (or its folder) is not writable."""
+        if path.is_dir():
+            raise IsADirectoryError(f"{path.name} is a directory")
+        if path.exists():
+            if not os.access(path, os.W_OK):
+                raise PermissionError(f"{path.name} is not writable")
+            return
+        # The folders are created on flush; the nearest existing one decides
+        parent = path.parent
+        while not parent.exists():
+            parent = parent.parent
+        if not parent.is_dir():
+            raise NotADirectoryError(f"{parent.name} is not a directory")
+        if not os.access(parent, os.W_OK | os.X_OK):
+            raise PermissionError(f"{parent.name} is not writable")
+
+    @staticmethod
+    def _append_bytes(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("ab") as f:
+            f.write(data)
+
+    @staticmethod
+    def _read_range(path: Path, offset: int, length: int) -> Tuple[str, int]:
+        with path.open("rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            f.seek(offset)
+            data = f.read(length)
+        return data.decode("utf-8", errors="replace"), size
+
+
+sandbox_files = SandboxFiles()
+atexit.register(sandbox_files.flush_sync)
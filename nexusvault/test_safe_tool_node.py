@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langgraph")
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+import agent
+from agent import SafeToolNode
+
+
+class FakeSession:
+    def __init__(self, tools):
+        self.tools = {tool.name: tool for tool in tools}
+
+    async def get(self, name):
+        return self.tools[name]
+
+
+def make_tool(name, coroutine):
+    return StructuredTool.from_function(coroutine=coroutine, name=name, description=name)
+
+
+def run_superstep(tools, calls):
+    """Run one real ToolNode step of a compiled graph for the given (name, args) tool calls."""
+    session = FakeSession(tools)
+    builder = StateGraph(MessagesState)
+    builder.add_node("tools", SafeToolNode(tools, resolve=lambda thread_id: session))
+    builder.add_edge(START, "tools")
+    builder.add_edge("tools", END)
+    graph = builder.compile()
+    tool_calls = [{"name": name, "args": args, "id": f"call-{i}"} for i, (name, args) in enumerate(calls)]
+    state = {"messages": [AIMessage(content="", tool_calls=tool_calls)]}
+    result = asyncio.run(graph.ainvoke(state, {"configurable": {"thread_id": "test"}}))
+    return result["messages"][1:]
+
+
+@pytest.fixture(autouse=True)
+def fresh_limits(monkeypatch):
+    monkeypatch.setattr(agent, "_tool_limits", {})
+
+
+def test_slow_tool_times_out(monkeypatch):
+    async def slow(seconds: float) -> str:
+        await asyncio.sleep(seconds)
+        return "finished"
+
+    async def fast() -> str:
+        return "fast"
+
+    monkeypatch.setitem(agent.TOOL_TIMEOUTS, "slow", 0.2)
+    messages = run_superstep([make_tool("slow", slow), make_tool("fast", fast)], [("slow", {"seconds": 5}), ("fast", {})])
+    assert [m.tool_call_id for m in messages] == ["call-0", "call-1"]
+    assert messages[0].content == "Tool error (slow): timed out after 0.2s"
+    assert messages[1].content == "fast"
+
+
+def test_concurrency_limit_is_enforced(monkeypatch):
+    running = 0
+    peak = 0
+
+    async def busy(i: int) -> str:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        return str(i)
+
+    monkeypatch.setitem(agent.TOOL_CONCURRENCY, "busy", 2)
+    messages = run_superstep([make_tool("busy", busy)], [("busy", {"i": i}) for i in range(6)])
+    assert [m.content for m in messages] == [str(i) for i in range(6)]
+    assert peak == 2
+
+
+def test_tool_errors_become_messages():
+    async def broken() -> str:
+        raise ValueError("boom")
+
+    messages = run_superstep([make_tool("broken", broken)], [("broken", {})])
+    assert messages[0].content == "Tool error (broken): boom"
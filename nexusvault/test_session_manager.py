@@ -0,0 +1,33 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+pytest.importorskip("gradio")
+pytest.importorskip("langgraph")
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["NEXUS_CHECKPOINT_PATH"] = os.path.join(tempfile.mkdtemp(), "checkpoints.db")
+
+import app
+from app import SessionManager
+from checkpointer import close_checkpointer
+
+
+def test_reused_session_id_keeps_its_tools_after_the_old_cleanup():
+    async def scenario():
+        sessions = SessionManager(idle_ttl=0.05)
+        first = await sessions.get("client-1")
+        await asyncio.sleep(0.1)
+        # The idle agent is evicted by this call, and a new one is set up under the same id
+        second = await sessions.get("client-1")
+        await asyncio.gather(*sessions._cleanups)
+        registered = second.runtime.sessions.get("client-1")
+        await sessions.shutdown()
+        await close_checkpointer()
+        return first, second, registered
+
+    first, second, registered = asyncio.run(scenario())
+    assert first is not second
+    assert registered is second.tools
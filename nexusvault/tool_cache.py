@@ -0,0 +1,179 @@
+# tool_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from langchain_core.tools import BaseTool, StructuredTool
+
+TOOL_CACHE_PATH = os.getenv("NEXUS_TOOL_CACHE_PATH", "tool_cache.db")
+# Seconds a result stays fresh, per tool name. Only tools whose results are the same for every session belong
+# in this process-wide cache; browser page reads are cached per session (see tools.PageCache)
+TOOL_TTLS = {
+    "search": 6 * 60 * 60,
+    "wikipedia": 7 * 24 * 60 * 60,
+}
+DEFAULT_TTL = 60 * 60
+MAX_ENTRIES = 10_000  # on disk
+MEMORY_ENTRIES = 512  # hot results served without touching SQLite
+MAX_VALUE_CHARS = 1_000_000
+
+
+class ToolCache:
+    """Memoizes tool results: an in-memory LRU in front of a size-bounded SQLite store.
+
+    Concurrent identical calls share one in-flight call instead of each going to the network. SQLite is only
+    used from worker threads, never on the event loop.
+    """
+
+    def __init__(self, path: str = TOOL_CACHE_PATH, max_entries: int = MAX_ENTRIES, memory_entries: int = MEMORY_ENTRIES):
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.metrics: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tool_cache ("
+            "key TEXT PRIMARY KEY, tool TEXT, value TEXT, expires REAL, last_used REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tool_cache_last_used ON tool_cache (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(tool: str, args: Dict[str, Any]) -> str:
+        raw = f"{tool}\n{json.dumps(args, sort_keys=True, default=str)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _count(self, tool: str, metric: str) -> None:
+        counts = self.metrics.setdefault(tool, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0})
+        counts[metric] += 1
+
+    def _remember(self, key: str, value: str, expires: float) -> None:
+        self._memory[key] = (value, expires)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _memory_get(self, tool: str, key: str) -> Optional[str]:
+        if key in self._memory:
+            value, expires = self._memory[key]
+            if expires > time.time():
+                self._memory.move_to_end(key)
+                self._count(tool, "memory_hits")
+                return value
+            del self._memory[key]
+        return None
+
+    def _disk_get(self, key: str) -> Optional[Tuple[str, float]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM tool_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                return None
+            self._conn.execute("UPDATE tool_cache SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return row
+
+    def _disk_put(self, tool: str, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tool_cache (key, tool, value, expires, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, tool, value, now + ttl, now),
+            )
+            self._conn.execute("DELETE FROM tool_cache WHERE expires <= ?", (now,))
+            self._conn.execute(
+                "DELETE FROM tool_cache WHERE key IN ("
+                "SELECT key FROM tool_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    async def get_or_call(self, tool: str, args: Dict[str, Any], call: Callable[[], Awaitable[Any]], ttl: float) -> str:
+        """The cached result for these arguments, or the result of call(), which is then cached."""
+        key = self.key(tool, args)
+        value = self._memory_get(tool, key)
+        if value is not None:
+            return value
+        if key in self._inflight:
+            self._count(tool, "coalesced")
+            return await asyncio.shield(self._inflight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            row = await asyncio.to_thread(self._disk_get, key)
+            if row is not None:
+                value, expires = row
+                self._count(tool, "disk_hits")
+                self._remember(key, value, expires)
+                future.set_result(value)
+                return value
+            self._count(tool, "misses")
+            value = str(await call())
+            future.set_result(value)
+        except asyncio.CancelledError:
+            # Callers sharing this call get an ordinary error: a cancellation would escape their error handling
+            # and end their own (possibly another session's) superstep
+            if not future.done():
+                future.set_exception(RuntimeError(f"the shared {tool} call was cancelled before it finished"))
+                future.exception()
+            raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+                future.exception()  # marks it retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._inflight[key]
+        if len(value) <= MAX_VALUE_CHARS:
+            self._remember(key, value, time.time() + ttl)
+            try:
+                await asyncio.to_thread(self._disk_put, tool, key, value, ttl)
+            except sqlite3.Error as e:
+                print(f"Tool cache write error: {e}")
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM tool_cache").fetchone()[0]
+        per_tool = {}
+        for tool, counts in self.metrics.items():
+            lookups = sum(counts.values())
+            hits = counts["memory_hits"] + counts["disk_hits"] + counts["coalesced"]
+            per_tool[tool] = {**counts, "hit_rate": hits / lookups if lookups else 0.0}
+        return {"entries": entries, "memory_entries": len(self._memory), "tools": per_tool}
+
+
+tool_cache = ToolCache()
+
+
+def cached_tool(
+    tool: BaseTool,
+    ttl: Optional[float] = None,
+    context: Optional[Callable[[], Awaitable[str]]] = None,
+    cache: ToolCache = tool_cache,
+) -> BaseTool:
+    """Wrap a tool so identical calls are answered from the cache.
+
+    Only for tools whose results do not depend on the session. `context` supplies anything besides the arguments
+    that the result depends on.
+    """
+    ttl = TOOL_TTLS.get(tool.name, DEFAULT_TTL) if ttl is None else ttl
+
+    async def run(**kwargs) -> str:
+        args = dict(kwargs)
+        if context:
+            args["_context"] = await context()
+        return await cache.get_or_call(tool.name, args, lambda: tool.ainvoke(kwargs), ttl)
+
+    return StructuredTool.from_function(
+        coroutine=run, name=tool.name, description=tool.description, args_schema=tool.args_schema
+    )
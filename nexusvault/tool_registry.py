@@ -0,0 +1,74 @@
+# tool_registry.py
+import asyncio
+import inspect
+import time
+from typing import Awaitable, Callable, Dict, List, Type, Union
+
+from langchain_core.tools import BaseTool, StructuredTool
+from pydantic import BaseModel
+
+Loader = Callable[[str], Union[BaseTool, Awaitable[BaseTool]]]
+
+
+def _schema_only(**kwargs) -> str:
+    raise RuntimeError("This tool is a schema placeholder; run it through the session's tools")
+
+
+def schema_tool(name: str, description: str, args_schema: Type[BaseModel]) -> BaseTool:
+    """A tool with only a name, description and argument schema – enough for bind_tools."""
+    return StructuredTool.from_function(func=_schema_only, name=name, description=description, args_schema=args_schema)
+
+
+class ToolRegistry:
+    """Every tool's schema, available at import; each backend is imported and built on its first call.
+
+    Loaders take the session id. Shared tools are built once per process (concurrent first calls wait for
+    the same build), per-session tools once per call to load (the caller keeps them).
+    """
+
+    def __init__(self):
+        self._schemas: Dict[str, BaseTool] = {}
+        self._loaders: Dict[str, Loader] = {}
+        self._per_session: set = set()
+        self._shared: Dict[str, BaseTool] = {}
+        self._building: Dict[str, asyncio.Lock] = {}
+        self.load_times: Dict[str, float] = {}
+
+    def register(self, name: str, description: str, args_schema: Type[BaseModel], loader: Loader,
+                 per_session: bool = False) -> None:
+        self._schemas[name] = schema_tool(name, description, args_schema)
+        self._loaders[name] = loader
+        if per_session:
+            self._per_session.add(name)
+
+    def register_tool(self, tool: BaseTool) -> None:
+        """A tool that is cheap to create and the same for every session."""
+        self._schemas[tool.name] = tool
+        self._shared[tool.name] = tool
+
+    def schemas(self) -> List[BaseTool]:
+        return list(self._schemas.values())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._schemas
+
+    async def load(self, name: str, session_id: str) -> BaseTool:
+        if name in self._shared:
+            return self._shared[name]
+        if name in self._per_session:
+            return await self._build(name, session_id)
+        async with self._building.setdefault(name, asyncio.Lock()):
+            if name not in self._shared:
+                self._shared[name] = await self._build(name, session_id)
+        self._building.pop(name, None)
+        return self._shared[name]
+
+    async def _build(self, name: str, session_id: str) -> BaseTool:
+        started = time.perf_counter()
+        tool = self._loaders[name](session_id)
+        if inspect.isawaitable(tool):
+            tool = await tool
+        if name not in self.load_times:
+            self.load_times[name] = time.perf_counter() - started
+            print(f"Loaded tool {name} in {self.load_times[name] * 1000:.0f} ms")
+        return tool
@@ -1,123 +1,390 @@
 # tools.py
-from playwright.async_api import async_playwright
-from langchain_community.agent_toolkits import PlayWrightBrowserToolkit
-from langchain_community.tools.wikipedia.tool import WikipediaQueryRun
-from langchain_experimental.tools import PythonREPLTool
-from langchain_community.utilities import GoogleSerperAPIWrapper, WikipediaAPIWrapper
+# Heavy backends (Playwright, langchain_community, Wikipedia, Serper) are imported inside their loaders,
+# so importing this module is cheap and their cost is paid on first use instead of at startup.
 from langchain.tools import tool
+from langchain_core.tools import StructuredTool
+from langgraph.config import get_stream_writer
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
+import json
 import os
-import requests
-from pathlib import Path
+import sys
+import asyncio
+from typing import TYPE_CHECKING, Dict, List, Optional
+from urllib.parse import urljoin, urlsplit
+from context import tool_output_store
+from tool_cache import cached_tool
+from tool_registry import ToolRegistry, schema_tool
+from python_pool import python_pool
+from sandbox_files import sandbox_files
 
-load_dotenv(override=True)
+# The notification queue lives in the repository's shared/ package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.notifications import credentials, notifier
+
+if TYPE_CHECKING:
+    from browser_pool import BrowserPool
 
-# === Pushover credentials (make sure these are set in your .env) ===
-PUSHOVER_TOKEN = os.getenv("PUSHOVER_TOKEN")
-PUSHOVER_USER = os.getenv("PUSHOVER_USER", os.getenv("PUSHOVER_USER_KEY"))  # supports both!  # ← double-check this name matches your .env
-PUSHOVER_URL = "https://api.pushover.net/1/messages.json"
+load_dotenv(override=True)
 
-serper = GoogleSerperAPIWrapper()
+registry = ToolRegistry()
 
 
 # ──────────────────────────────────────────────────────────────
-# 1. Browser tools (Playwright) – launches visible browser
+# 1. Browser tools (Playwright) – one shared headless browser,
+#    each session gets its own isolated context from the pool
 # ──────────────────────────────────────────────────────────────
-async def get_browser_tools():
-    playwright = await async_playwright().start()
-    browser = await playwright.chromium.launch(
-        headless=False,
-        args=["--no-sandbox", "--disable-setuid-sandbox", "--start-maximized"]
-    )
-    context = await browser.new_context(
-        viewport={"width": 1920, "height": 1080},
-        java_script_enabled=True,
-        bypass_csp=True
-    )
-    # Hide automation flags
-    await context.add_init_script("Object.defineProperty(navigator, 'webdriver', {get: () => false});")
-    context.set_default_timeout(90_000)
+CLICK_TIMEOUT_MS = 1_000
+class NavigateInput(BaseModel):
+    url: str = Field(..., description="url to navigate to")
+
+
+class ClickInput(BaseModel):
+    selector: str = Field(..., description="CSS selector for the element to click")
+
+
+class GetElementsInput(BaseModel):
+    selector: str = Field(..., description="CSS selector, such as '*', 'div', 'p', 'a', #id, .classname")
+    attributes: List[str] = Field(default_factory=lambda: ["innerText"], description="Set of attributes to retrieve for each element")
+
+
+class ExtractHyperlinksInput(BaseModel):
+    absolute_urls: bool = Field(default=False, description="Return absolute URLs instead of relative URLs")
+
 
-    toolkit = PlayWrightBrowserToolkit.from_browser(async_browser=browser)
-    await context.new_page()  # pre-warm
-    return toolkit.get_tools(), browser, playwright
+class NoInput(BaseModel):
+    pass
+
+
+# The browser tools (the Playwright toolkit's set), described here so the LLM can be bound without starting a browser
+BROWSER_SCHEMAS = [
+    schema_tool("click_element", "Click on an element with the given CSS selector", ClickInput),
+    schema_tool("navigate_browser", "Navigate a browser to the specified URL", NavigateInput),
+    schema_tool("previous_webpage", "Navigate back to the previous page in the browser history", NoInput),
+    schema_tool("extract_text", "Extract all the text on the current webpage", NoInput),
+    schema_tool("extract_hyperlinks", "Extract all hyperlinks on the current webpage", ExtractHyperlinksInput),
+    schema_tool("get_elements", "Retrieve elements in the current web page matching the given CSS selector", GetElementsInput),
+    schema_tool("current_webpage", "Returns the URL of the current page", NoInput),
+]
+BROWSER_TOOL_NAMES = {t.name for t in BROWSER_SCHEMAS}
+# Page reads that are cached until the page may have changed
+CACHED_BROWSER_TOOLS = {"extract_text", "extract_hyperlinks"}
+# Browser actions that may change the page
+PAGE_CHANGING_TOOLS = {"click_element", "navigate_browser", "previous_webpage"}
+
+
+class PageCache:
+    """One session's cache of page reads, so repeated extract_text/extract_hyperlinks calls on an unchanged page
+    are answered without re-reading it.
+
+    It lives and dies with the session's browser tools, so no other session ever sees its pages. Any click or
+    navigation, even to the same URL, clears it.
+    """
+
+    def __init__(self, pool: "BrowserPool", session_id: str):
+        self.pool = pool
+        self.session_id = session_id
+        self._items: Dict[str, str] = {}
+
+    def _key(self, name: str, args: Dict) -> str:
+        lease = self.pool.leases.get(self.session_id)
+        pages = lease.context.pages if lease else []
+        # A re-leased context is a different browser state, even on the same URL
+        page = f"{id(lease.context) if lease else 0}:{pages[-1].url if pages else ''}"
+        return json.dumps([name, page, args], sort_keys=True, default=str)
+
+    def read(self, tool):
+        async def run(**kwargs) -> str:
+            key = self._key(tool.name, kwargs)
+            if key not in self._items:
+                self._items[key] = str(await tool.ainvoke(kwargs))
+            return self._items[key]
+
+        return StructuredTool.from_function(
+            coroutine=run, name=tool.name, description=tool.description, args_schema=tool.args_schema
+        )
+
+    def action(self, tool):
+        async def run(**kwargs) -> str:
+            self._items.clear()
+            try:
+                return await tool.ainvoke(kwargs)
+            finally:
+                # Reads that ran alongside the action may have cached the page as it was changing
+                self._items.clear()
+
+        return StructuredTool.from_function(
+            coroutine=run, name=tool.name, description=tool.description, args_schema=tool.args_schema
+        )
+
+
+def get_browser_tools(session_id: str) -> list:
+    """The session's browser tools. Every call looks up the session's page in the pool, so they stay valid for the
+    whole session: if the pool closes the session's idle context, the next browser call leases a new one."""
+    from bs4 import BeautifulSoup
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+    from browser_pool import browser_pool
+
+    async def page():
+        return await browser_pool.page(session_id)
+
+    async def navigate_browser(url: str) -> str:
+        if urlsplit(url).scheme not in ("http", "https"):
+            raise ValueError("URL scheme must be 'http' or 'https'")
+        response = await (await page()).goto(url)
+        return f"Navigating to {url} returned status code {response.status if response else 'unknown'}"
+
+    async def click_element(selector: str) -> str:
+        try:
+            await (await page()).click(f"{selector} >> visible=1", strict=False, timeout=CLICK_TIMEOUT_MS)
+        except PlaywrightTimeoutError:
+            return f"Unable to click on element '{selector}'"
+        return f"Clicked element '{selector}'"
+
+    async def previous_webpage() -> str:
+        response = await (await page()).go_back()
+        if response is None:
+            return "Unable to navigate back; no previous page in the history"
+        return f"Navigated back to the previous page with URL '{response.url}'. Status code {response.status}"
+
+    async def extract_text() -> str:
+        soup = BeautifulSoup(await (await page()).content(), "lxml")
+        return " ".join(soup.stripped_strings)
+
+    async def extract_hyperlinks(absolute_urls: bool = False) -> str:
+        current = await page()
+        soup = BeautifulSoup(await current.content(), "lxml")
+        links = [urljoin(current.url, a["href"]) if absolute_urls else a["href"] for a in soup.find_all("a", href=True)]
+        return json.dumps(list(dict.fromkeys(links)))
+
+    async def get_elements(selector: str, attributes: Optional[List[str]] = None) -> str:
+        results = []
+        for element in await (await page()).query_selector_all(selector):
+            result = {}
+            for attribute in attributes or ["innerText"]:
+                value = await element.inner_text() if attribute == "innerText" else await element.get_attribute(attribute)
+                if value and value.strip():
+                    result[attribute] = value
+            if result:
+                results.append(result)
+        return json.dumps(results, ensure_ascii=False)
+
+    async def current_webpage() -> str:
+        return str((await page()).url)
+
+    functions = {f.__name__: f for f in (navigate_browser, click_element, previous_webpage, extract_text,
+                                         extract_hyperlinks, get_elements, current_webpage)}
+    page_cache = PageCache(browser_pool, session_id)
+    tools = []
+    for schema in BROWSER_SCHEMAS:
+        browser_tool = StructuredTool.from_function(
+            coroutine=functions[schema.name], name=schema.name, description=schema.description,
+            args_schema=schema.args_schema
+        )
+        if schema.name in CACHED_BROWSER_TOOLS:
+            browser_tool = page_cache.read(browser_tool)
+        elif schema.name in PAGE_CHANGING_TOOLS:
+            browser_tool = page_cache.action(browser_tool)
+        tools.append(browser_tool)
+    return tools
 
 
 # ──────────────────────────────────────────────────────────────
-# 2. Pushover notification – now 100% working
+# 2. Pushover notification – queued and delivered in the background
+#    (bursts are merged into one digest; see shared/notifications.py)
 # ──────────────────────────────────────────────────────────────
 @tool
 def send_push_notification(text: str) -> str:
     """Send a push notification to your phone instantly."""
-    if not PUSHOVER_TOKEN or not PUSHOVER_USER:
+    if not all(credentials()):
         return "Error: Pushover credentials missing in .env (PUSHOVER_TOKEN / PUSHOVER_USER_KEY)"
-    try:
-        response = requests.post(
-            PUSHOVER_URL,
-            data={"token": PUSHOVER_TOKEN, "user": PUSHOVER_USER, "message": text},
-            timeout=10
-        )
-        if response.status_code == 200:
-            return f"Push notification sent: {text}"
-        else:
-            return f"Pushover error {response.status_code}: {response.text}"
-    except Exception as e:
-        return f"Pushover failed: {str(e)}"
+    notifier.notify(text)
+    return f"Push notification queued: {text}"
+
+
+registry.register_tool(send_push_notification)
 
 
 # ──────────────────────────────────────────────────────────────
 # 3. Safe & working file tools (replaces buggy langchain ones)
+#    – buffered, atomic and confined to sandbox/; see sandbox_files.py
 # ──────────────────────────────────────────────────────────────
 @tool
-def write_markdown_file(filename: str, content: str) -> str:
+async def write_markdown_file(filename: str, content: str) -> str:
     """Write or overwrite a markdown (.md) or text file. Creates folders automatically."""
     try:
-        path = Path("sandbox") / filename
-        path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_text(content, encoding="utf-8")
+        await sandbox_files.write(filename, content)
         return f"File successfully saved: {filename}"
     except Exception as e:
         return f"Write failed: {str(e)}"
 
 
 @tool
-def append_to_file(filename: str, content: str) -> str:
+async def append_to_file(filename: str, content: str) -> str:
     """Append text to an existing file (or create if missing)."""
     try:
-        path = Path("sandbox") / filename
-        path.parent.mkdir(parents=True, exist_ok=True)
-        with path.open("a", encoding="utf-8") as f:
-            f.write(content + "\n")
+        await sandbox_files.append(filename, content + "\n")
         return f"Appended to {filename}"
     except Exception as e:
         return f"Append failed: {str(e)}"
 
 
+@tool
+async def read_file(filename: str, offset: int = 0, length: int = 4000) -> str:
+    """Read part of a sandbox file: `length` bytes starting at byte `offset`. Page through large files by increasing offset."""
+    try:
+        text, size = await sandbox_files.read(filename, offset, length)
+    except FileNotFoundError:
+        return f"No such file: {filename}"
+    except Exception as e:
+        return f"Read failed: {str(e)}"
+    end = min(offset + length, size)
+    return f"[bytes {offset}-{end} of {size}{'' if end >= size else f'; next offset {end}'}]\n{text}"
+
+
+registry.register_tool(write_markdown_file)
+registry.register_tool(append_to_file)
+registry.register_tool(read_file)
+
+
 # ──────────────────────────────────────────────────────────────
-# 4. Other tools
+# 4. Python – each session runs code in its own sandboxed worker process
 # ──────────────────────────────────────────────────────────────
-@tool
-def search(query: str) -> str:
-    """Google search via Serper."""
-    return serper.run(query)
-
-
-async def get_all_tools():
-    """Called by agent.py – returns every tool in one list."""
-    browser_tools, _, _ = await get_browser_tools()
-    
-    wikipedia = WikipediaAPIWrapper()
-    wiki_tool = WikipediaQueryRun(api_wrapper=wikipedia)
-    python_repl = PythonREPLTool()
-
-    return (
-        browser_tools +
-        [
-            send_push_notification,
-            search,
-            write_markdown_file,
-            append_to_file,
-            python_repl,
-            wiki_tool
-        ]
-    )
\ No newline at end of file
+PYTHON_OUTPUT_CHARS = 100_000
+PYTHON_DESCRIPTION = (
+    "A Python shell. Use this to execute python commands. Input should be a valid python command. "
+    "If you want to see the output of a value, you should print it out with `print(...)`. "
+    "Variables persist between calls."
+)
+
+
+class PythonInput(BaseModel):
+    query: str = Field(..., description="Python code to run")
+
+
+def get_python_tool(session_id: str):
+    async def python_repl(query: str) -> str:
+        try:
+            # Lets graph.astream(stream_mode="custom") show output while the code is still running
+            write = get_stream_writer()
+        except RuntimeError:
+            write = None
+        chunks = []
+        async for chunk in python_pool.run(session_id, query):
+            chunks.append(chunk)
+            if write:
+                write({"type": "tool_output", "name": "Python_REPL", "content": chunk})
+        output = "".join(chunks)
+        return output[:PYTHON_OUTPUT_CHARS] if output else "(no output – use print() to see values)"
+
+    return StructuredTool.from_function(
+        coroutine=python_repl, name="Python_REPL", description=PYTHON_DESCRIPTION, args_schema=PythonInput
+    )
+
+
+registry.register("Python_REPL", PYTHON_DESCRIPTION, PythonInput, get_python_tool, per_session=True)
+
+
+# ──────────────────────────────────────────────────────────────
+# 5. Other tools
+# ──────────────────────────────────────────────────────────────
+class QueryInput(BaseModel):
+    query: str = Field(..., description="query to look up")
+
+
+def load_search(session_id: str):
+    from langchain_community.utilities import GoogleSerperAPIWrapper
+    serper = GoogleSerperAPIWrapper()
+
+    @tool
+    def search(query: str) -> str:
+        """Google search via Serper."""
+        return serper.run(query)
+
+    return cached_tool(search)
+
+
+WIKIPEDIA_DESCRIPTION = (
+    "A wrapper around Wikipedia. Useful for when you need to answer general questions about people, places, "
+    "companies, facts, historical events, or other subjects. Input should be a search query."
+)
+
+
+def load_wikipedia(session_id: str):
+    from langchain_community.tools.wikipedia.tool import WikipediaQueryRun
+    from langchain_community.utilities import WikipediaAPIWrapper
+    return cached_tool(WikipediaQueryRun(api_wrapper=WikipediaAPIWrapper()))
+
+
+RETRIEVE_DESCRIPTION = "Read the full text of an earlier tool output that was shortened in the conversation, a slice at a time."
+
+
+class RetrieveInput(BaseModel):
+    ref: str = Field(..., description="The ref given in the shortened tool output")
+    offset: int = Field(default=0, description="Character to start reading from")
+    length: int = Field(default=4000, description="How many characters to read")
+
+
+def get_retrieve_tool(session_id: str):
+    """retrieve_tool_output for one session, which can only read that session's stored outputs."""
+    def retrieve_tool_output(ref: str, offset: int = 0, length: int = 4000) -> str:
+        content = tool_output_store.get(session_id, ref)
+        if content is None:
+            return f"No stored tool output with ref {ref}"
+        return f"[characters {offset}-{min(offset + length, len(content))} of {len(content)}]\n{content[offset:offset + length]}"
+
+    return StructuredTool.from_function(
+        func=retrieve_tool_output, name="retrieve_tool_output", description=RETRIEVE_DESCRIPTION, args_schema=RetrieveInput
+    )
+
+
+registry.register("search", "Google search via Serper.", QueryInput, load_search)
+registry.register("wikipedia", WIKIPEDIA_DESCRIPTION, QueryInput, load_wikipedia)
+registry.register("retrieve_tool_output", RETRIEVE_DESCRIPTION, RetrieveInput, get_retrieve_tool, per_session=True)
+
+
+# ──────────────────────────────────────────────────────────────
+# 6. Per-session tools and shared schemas
+# ──────────────────────────────────────────────────────────────
+def get_tool_schemas() -> list:
+    """Every tool's schema, for binding to the shared LLM – nothing is imported or started."""
+    return BROWSER_SCHEMAS + registry.schemas()
+
+
+class SessionTools:
+    """One session's tools. Each is built on its first call, and the browser context is leased on the first browser call."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self._tools: Dict[str, object] = {}
+        self._browser_tools: Dict[str, object] = {}
+        self._lock = asyncio.Lock()
+
+    async def get(self, name: str):
+        async with self._lock:
+            if name in BROWSER_TOOL_NAMES:
+                if not self._browser_tools:
+                    self._browser_tools = {t.name: t for t in get_browser_tools(self.session_id)}
+                tool = self._browser_tools[name]
+            else:
+                if name not in self._tools:
+                    self._tools[name] = await registry.load(name, self.session_id)
+                tool = self._tools[name]
+        self.touch()
+        return tool
+
+    def touch(self) -> None:
+        if self._browser_tools:
+            from browser_pool import browser_pool
+            lease = browser_pool.leases.get(self.session_id)
+            if lease:
+                lease.touch()
+
+    async def close(self) -> None:
+        if self._browser_tools:
+            from browser_pool import browser_pool
+            await browser_pool.release(self.session_id)
+        await python_pool.release(self.session_id)
+        await sandbox_files.flush()
+        self._tools.clear()
+        self._browser_tools.clear()
@@ -0,0 +1 @@
+# Modules used by more than one of the apps in this repository
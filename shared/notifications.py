@@ -0,0 +1,285 @@
+# notifications.py
+# Used by nexusvault/ and stock/, which put the repository root on sys.path to import it.
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import httpx
+
+PUSHOVER_URL = os.getenv("PUSHOVER_URL", "https://api.pushover.net/1/messages.json")
+QUEUE_PATH = os.getenv("NOTIFICATION_QUEUE_PATH", "notifications.db")
+COALESCE_WINDOW = 2.0  # seconds a message waits for others to the same recipient to join its digest
+RECIPIENT_INTERVAL = 5.0  # minimum seconds between pushes to one recipient
+MAX_MESSAGE_CHARS = 1024  # Pushover's message limit
+MAX_ATTEMPTS = 5
+BASE_RETRY_DELAY = 5.0
+MAX_RETRY_DELAY = 300.0
+POLL_INTERVAL = 5.0
+DEFAULT_RECIPIENT = "default"
+
+
+def credentials(recipient: str = DEFAULT_RECIPIENT) -> Tuple[Optional[str], Optional[str]]:
+    """The Pushover (user key, app token) for a recipient alias, read from the environment.
+
+    "default" uses PUSHOVER_USER (or PUSHOVER_USER_KEY) and PUSHOVER_TOKEN; another alias uses
+    PUSHOVER_USER_<ALIAS> and PUSHOVER_TOKEN_<ALIAS>, falling back to PUSHOVER_TOKEN. The queue only
+    stores the alias, so no credentials are written to disk.
+    """
+    if recipient == DEFAULT_RECIPIENT:
+        return os.getenv("PUSHOVER_USER", os.getenv("PUSHOVER_USER_KEY")), os.getenv("PUSHOVER_TOKEN")
+    suffix = recipient.upper()
+    return os.getenv(f"PUSHOVER_USER_{suffix}"), os.getenv(f"PUSHOVER_TOKEN_{suffix}", os.getenv("PUSHOVER_TOKEN"))
+
+
+def digest(messages: List[Tuple[int, str]]) -> Tuple[str, List[int]]:
+    """Merge queued (id, message) pairs into one push; returns its text and the ids it covers."""
+    if len(messages) == 1:
+        id, text = messages[0]
+        return text[:MAX_MESSAGE_CHARS], [id]
+    lines: List[str] = []
+    ids: List[int] = []
+    length = 32  # room for the header
+    for id, text in messages:
+        line = f"• {text}"[:MAX_MESSAGE_CHARS - 32]
+        if ids and length + len(line) + 1 > MAX_MESSAGE_CHARS:
+            break  # the rest go in the next digest
+        lines.append(line)
+        ids.append(id)
+        length += len(line) + 1
+    return f"{len(ids)} notifications:\n" + "\n".join(lines), ids
+
+
+class NotificationDispatcher:
+    """Sends push notifications from a background thread, so callers never wait on the network.
+
+    Messages are queued in SQLite and survive a restart. Messages sent to one recipient within
+    COALESCE_WINDOW are merged into one digest. Each recipient gets at most one push per
+    RECIPIENT_INTERVAL, and failed sends are retried with exponential backoff. One pooled HTTP
+    client is used for every send. Rows name a recipient alias; its credentials are looked up at
+    send time (see credentials()). The queue database is opened on first use, not on import.
+    """
+
+    def __init__(self, path: str = QUEUE_PATH, url: str = PUSHOVER_URL,
+                 coalesce_window: float = COALESCE_WINDOW, recipient_interval: float = RECIPIENT_INTERVAL):
+        self.url = url
+        self.coalesce_window = coalesce_window
+        self.recipient_interval = recipient_interval
+        self.sent = 0
+        self.digests = 0
+        self.failed = 0
+        self._last_sent: Dict[str, float] = {}
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """The queue, opened (and its table created) on first use; callers hold the lock."""
+        if self._connection is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS notifications ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, recipient TEXT, message TEXT, status TEXT, "
+                "attempts INTEGER DEFAULT 0, next_attempt REAL, created REAL, error TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS notifications_pending ON notifications (status, next_attempt)")
+            conn.commit()
+            self._connection = conn
+        return self._connection
+
+    def start(self) -> None:
+        """Start the dispatcher thread if it is not running."""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,), name="notifications", daemon=True)
+            self._thread.start()
+        ready.wait()
+
+    def _run(self, ready: threading.Event) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._wake = asyncio.Event()
+        ready.set()
+        self._loop.run_until_complete(self._work())
+
+    def notify(self, message: str, recipient: str = DEFAULT_RECIPIENT) -> int:
+        """Queue a push to a recipient alias and return its id right away; it is delivered in the background."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO notifications (recipient, message, status, next_attempt, created) "
+                "VALUES (?, ?, 'pending', ?, ?)",
+                (recipient, message, now, now),
+            )
+            self._conn.commit()
+        self.start()
+        self._loop.call_soon_threadsafe(self._wake.set)
+        return cursor.lastrowid
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM notifications WHERE status = 'pending'").fetchone()[0]
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Block until the queue is empty (for scripts about to exit); False if it timed out."""
+        if not self.pending():
+            return True
+        self.start()
+        deadline = time.monotonic() + timeout
+        while self.pending():
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {"sent": self.sent, "digests": self.digests, "failed": self.failed, "pending": self.pending()}
+
+    def _pending_rows(self) -> List[Tuple[int, str, str, int, float, float]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, recipient, message, attempts, next_attempt, created FROM notifications "
+                "WHERE status = 'pending' ORDER BY id"
+            ).fetchall()
+
+    def _ready_at(self, row) -> float:
+        _, recipient, _, _, next_attempt, created = row
+        return max(next_attempt, created + self.coalesce_window,
+                   self._last_sent.get(recipient, 0.0) + self.recipient_interval)
+
+    async def _work(self) -> None:
+        async with httpx.AsyncClient(timeout=httpx.Timeout(10.0)) as client:
+            while True:
+                self._wake.clear()
+                now = time.time()
+                groups: Dict[str, list] = {}
+                for row in self._pending_rows():
+                    if row[4] <= now:
+                        groups.setdefault(row[1], []).append(row)
+                for recipient, rows in groups.items():
+                    # A recipient's batch goes out once its oldest message is ready
+                    if self._ready_at(rows[0]) <= now:
+                        await self._send(client, recipient, rows)
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self._idle_timeout())
+                except asyncio.TimeoutError:
+                    pass
+
+    def _idle_timeout(self) -> float:
+        rows = self._pending_rows()
+        if not rows:
+            return POLL_INTERVAL
+        return min(POLL_INTERVAL, max(0.05, min(self._ready_at(row) for row in rows) - time.time()))
+
+    async def _send(self, client: httpx.AsyncClient, recipient: str, rows: list) -> None:
+        text, ids = digest([(row[0], row[2]) for row in rows])
+        attempts = {row[0]: row[3] + 1 for row in rows}
+        self._last_sent[recipient] = time.time()
+        user, token = credentials(recipient)
+        if not user or not token:
+            self._record(ids, attempts, f"no Pushover credentials in the environment for {recipient!r}", True)
+            return
+        try:
+            response = await client.post(self.url, data={"token": token, "user": user, "message": text})
+            error = None if response.status_code == 200 else f"HTTP {response.status_code}: {response.text[:200]}"
+            # Other client errors (bad token or user) will not get better by retrying
+            permanent = 400 <= response.status_code < 500 and response.status_code != 429
+        except httpx.HTTPError as e:
+            error, permanent = str(e), False
+        self._record(ids, attempts, error, permanent)
+        if error is None:
+            self.sent += len(ids)
+            self.digests += len(ids) > 1
+
+    def _record(self, ids: List[int], attempts: Dict[int, int], error: Optional[str], permanent: bool) -> None:
+        now = time.time()
+        with self._lock:
+            for id in ids:
+                if error is None:
+                    self._conn.execute("UPDATE notifications SET status = 'sent', attempts = ? WHERE id = ?", (attempts[id], id))
+                elif permanent or attempts[id] >= MAX_ATTEMPTS:
+                    print(f"Giving up on notification {id}: {error}")
+                    self.failed += 1
+                    self._conn.execute(
+                        "UPDATE notifications SET status = 'failed', attempts = ?, error = ? WHERE id = ?",
+                        (attempts[id], error, id),
+                    )
+                else:
+                    delay = min(MAX_RETRY_DELAY, BASE_RETRY_DELAY * 2 ** (attempts[id] - 1))
+                    self._conn.execute(
+                        "UPDATE notifications SET attempts = ?, error = ?, next_attempt = ? WHERE id = ?",
+                        (attempts[id], error, now + delay, id),
+                    )
+            self._conn.commit()
+
+
+class StubPushover:
+    """Local stand-in for the Pushover API that records what it receives; point PUSHOVER_URL at .url."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, status: int = 200):
+        self.host = host
+        self.port = port
+        self.status = status
+        self.received: List[Dict[str, str]] = []
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/1/messages.json"
+
+    def start(self) -> str:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+                fields = {key: values[0] for key, values in parse_qs(body).items()}
+                stub.received.append(fields)
+                print(f"[stub pushover] {fields.get('user')}: {fields.get('message')}")
+                reply = json.dumps({"status": 1 if stub.status == 200 else 0, "request": "stub"}).encode("utf-8")
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="stub-pushover", daemon=True).start()
+        return self.url
+
+    def stop(self) -> None:
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+notifier = NotificationDispatcher()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Pushover API")
+    parser.add_argument("--port", type=int, default=8765)
+    options = parser.parse_args()
+    stub = StubPushover(port=options.port)
+    print(f"Stub Pushover listening; set PUSHOVER_URL={stub.start()}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
@@ -2,7 +2,9 @@ from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
 from crewai_tools import SerperDevTool
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import os
 from crewai.memory import LongTermMemory, ShortTermMemory, EntityMemory
 from crewai.memory.storage.rag_storage import RAGStorage
 from crewai.memory.storage.ltm_sqlite_storage import LTMSQLiteStorage
@@ -38,6 +40,10 @@ class TrendingCompanyResearchList(BaseModel):
     research_list: List[TrendingCompanyResearch] = Field(description="Comprehensive research on all trending companies")
 
 
+# Research runs at once in fan-out mode
+MAX_RESEARCH_CONCURRENCY = int(os.getenv("MAX_RESEARCH_CONCURRENCY", "3"))
+
+
 # =========================
 # CrewBase Class
 # =========================
@@ -59,6 +65,10 @@ class StockPicker():
 
     @agent
     def financial_researcher(self) -> Agent:
+        return self.new_financial_researcher()
+
+    def new_financial_researcher(self) -> Agent:
+        """A fresh researcher, so concurrent fan-out runs never share an agent."""
         return Agent(
             config=self.agents_config["financial_researcher"],
             tools=[SerperDevTool()]
@@ -111,6 +121,11 @@ class StockPicker():
             process=Process.hierarchical,
             verbose=True,
             manager_agent=manager,
+            **self.memory_config()
+        )
+
+    def memory_config(self) -> dict:
+        return dict(
             memory=True,
 
             # Long-term memory (SQLite) - OK
@@ -140,4 +155,89 @@ class StockPicker():
                     path="./memory/"
                 )
             ),
-        )
\ No newline at end of file
+        )
+
+    # ---------- Fan-out Mode ----------
+
+    def run_fan_out(self, inputs: dict, max_concurrency: int = MAX_RESEARCH_CONCURRENCY):
+        """Find trending companies, research each one in its own concurrent run, then pick the best.
+
+        Replaces the manager's single research task, so the research phase takes as long as the slowest
+        company instead of the sum of all of them.
+        """
+        finder = Crew(
+            agents=[self.trending_company_finder()],
+            tasks=[self.find_trending_companies()],
+            process=Process.sequential,
+            verbose=True,
+            **self.memory_config()
+        )
+        companies: Optional[TrendingCompanyList] = finder.kickoff(inputs=inputs).pydantic
+        if companies is None or not companies.companies:
+            raise RuntimeError("The trending company finder did not return any companies")
+
+        research, missing = self.research_companies(companies, inputs, max_concurrency)
+        if not research.research_list:
+            raise RuntimeError(f"Research failed for all {len(companies.companies)} companies; nothing to pick from")
+        os.makedirs("output", exist_ok=True)
+        with open("output/research_report.json", "w", encoding="utf-8") as f:
+            f.write(research.model_dump_json(indent=2))
+        if missing:
+            print(f"No research for {', '.join(missing)}; picking from "
+                  f"{len(research.research_list)} of {len(companies.companies)} companies")
+            gaps = (f"Research is missing for: {', '.join(missing)}. Say so in your answer, and do not present "
+                    "the comparison as covering every trending company.")
+        else:
+            gaps = "Research is available for every trending company."
+
+        config = self.tasks_config["pick_best_company"]
+        picker_agent = self.stock_picker()
+        # The findings go in as an input value: placeholders are only read from the description itself,
+        # so the JSON's braces reach the agent unchanged
+        pick = Task(
+            description=f"{config['description']}\n\nResearch findings:\n{{research_findings}}\n\n{{research_gaps}}",
+            expected_output=config["expected_output"],
+            agent=picker_agent,
+            output_file=config["output_file"]
+        )
+        picker = Crew(
+            agents=[picker_agent],
+            tasks=[pick],
+            process=Process.sequential,
+            verbose=True,
+            **self.memory_config()
+        )
+        return picker.kickoff(inputs={**inputs, "research_findings": research.model_dump_json(indent=2),
+                                      "research_gaps": gaps})
+
+    def research_companies(self, companies: TrendingCompanyList, inputs: dict,
+                           max_concurrency: int = MAX_RESEARCH_CONCURRENCY
+                           ) -> Tuple[TrendingCompanyResearchList, List[str]]:
+        """Research every company concurrently, at most max_concurrency at a time, keeping their order.
+
+        Returns the research that came back and the names of the companies that got none.
+        """
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="research") as pool:
+            results = list(pool.map(lambda company: self.research_company(company, inputs), companies.companies))
+        missing = [company.name for company, result in zip(companies.companies, results) if result is None]
+        return TrendingCompanyResearchList(research_list=[r for r in results if r is not None]), missing
+
+    def research_company(self, company: TrendingCompany, inputs: dict) -> Optional[TrendingCompanyResearch]:
+        config = self.tasks_config["research_company"]
+        researcher = self.new_financial_researcher()
+        task = Task(
+            description=config["description"],
+            expected_output=config["expected_output"],
+            agent=researcher,
+            output_pydantic=TrendingCompanyResearch
+        )
+        # No crew memory here: the parallel runs would all write to the same memory stores at once
+        crew = Crew(agents=[researcher], tasks=[task], process=Process.sequential, verbose=True)
+        try:
+            result = crew.kickoff(inputs={**inputs, **company.model_dump()})
+        except Exception as e:
+            print(f"Research failed for {company.name}: {e}")
+            return None
+        if result.pydantic is None:
+            print(f"Research for {company.name} returned no structured result")
+        return result.pydantic
\ No newline at end of file
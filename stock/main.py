@@ -5,6 +5,7 @@ import os
 from datetime import datetime
 from dotenv import load_dotenv
 from app.crew import StockPicker
+from shared.notifications import notifier
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 
 load_dotenv()
@@ -19,13 +20,20 @@ def run():
         "current_date": str(datetime.now())
     }
 
-    # Create and run the crew
-    result = StockPicker().crew().kickoff(inputs=inputs)
+    # Create and run the crew; --fan-out researches each company in its own concurrent run
+    if "--fan-out" in sys.argv:
+        result = StockPicker().run_fan_out(inputs)
+    else:
+        result = StockPicker().crew().kickoff(inputs=inputs)
 
     # Print the result
     print("\n\n=== FINAL DECISION ===\n\n")
     print(result.raw)
 
+    # Notifications are delivered in the background; give them a chance to go out before exiting
+    if not notifier.flush(timeout=30):
+        print(f"{notifier.pending()} notifications still queued; they will be sent on the next run")
+
 
 if __name__ == "__main__":
     run()
@@ -1 +1,5 @@
+import os
+import sys
 
+# The notification queue lives in the repository's shared/ package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -1,8 +1,7 @@
 from crewai.tools import BaseTool
 from typing import Type
 from pydantic import BaseModel, Field
-import os
-import requests
+from shared.notifications import credentials, notifier
 
 
 class PushNotification(BaseModel):
@@ -19,11 +18,10 @@ class PushNotificationTool(BaseTool):
     args_schema: Type[BaseModel] = PushNotification
 
     def _run(self, message: str) -> str:
-        pushover_user = os.getenv("PUSHOVER_USER")
-        pushover_token = os.getenv("PUSHOVER_TOKEN")
-        pushover_url = "https://api.pushover.net/1/messages.json"
+        if not all(credentials()):
+            return '{"notification": "error", "reason": "PUSHOVER_USER / PUSHOVER_TOKEN not set"}'
 
         print(f"Push: {message}")
-        payload = {"user": pushover_user, "token": pushover_token, "message": message}
-        requests.post(pushover_url, data=payload)
-        return '{"notification": "ok"}'
\ No newline at end of file
+        # Queued and sent by a background thread; main.py flushes the queue before exiting
+        notifier.notify(message)
+        return '{"notification": "queued"}'
\ No newline at end of file